@@ -11,22 +11,39 @@ import { HaikuPost, ReactionId, Visibility } from './types';
 import { getInitialReactions } from './constants';
 import { useAuth } from './contexts/AuthContext';
 import { useToast } from './contexts/ToastContext';
-import { fetchPosts as apiFetchPosts, createPost as apiCreatePost, react as apiReact, unreact as apiUnreact, replyToPost as apiReplyToPost, quotePost as apiQuotePost } from './services/backendService';
+import { fetchPosts as apiFetchPosts, createPost as apiCreatePost, react as apiReact, unreact as apiUnreact, replyToPost as apiReplyToPost, quotePost as apiQuotePost, subscribeEvents, BackendPost } from './services/backendService';
 import ProtectedRoute from './components/ProtectedRoute';
 
-const mapCountsToReactions = (sense?: number, fukai?: number, postId?: string) => {
+const mapCountsToReactions = (sense?: number, fukai?: number, postId?: string, viewerReactions?: string[] | null) => {
     const reactions = getInitialReactions();
     const storageKey = 'reactedByPost';
     const store = JSON.parse(localStorage.getItem(storageKey) || '{}');
     
     return reactions.map(r => {
-        const isReacted = postId ? !!store[`${postId}:${r.id}`] : false;
+        // サーバーが返す閲覧者のリアクションを優先し、未ログイン（null）のときだけ以前のローカル記録を使う
+        const isReacted = viewerReactions ? viewerReactions.includes(r.id) : (postId ? !!store[`${postId}:${r.id}`] : false);
         if (r.id === (ReactionId as any).Sense) return { ...r, count: sense ?? 0, isReacted };
         if (r.id === (ReactionId as any).Fukai) return { ...r, count: fukai ?? 0, isReacted };
         return { ...r, isReacted };
     });
 };
 
+const mapBackendPost = (p: BackendPost): HaikuPost => ({
+    id: String(p.id),
+    author: p.author_name || '匿名',
+    authorAvatar: p.author_avatar || `https://picsum.photos/seed/${p.id}/100/100`,
+    line1: p.line1,
+    line2: p.line2,
+    line3: p.line3,
+    image: p.image,
+    reactions: mapCountsToReactions(p.sense_count, p.fukai_count, String(p.id), p.viewer_reactions),
+    timestamp: p.created_at ? new Date(p.created_at).getTime() : Date.now(),
+    visibility: Visibility.Public,
+    isAiGenerated: false,
+    replyToId: p.reply_to_id ? String(p.reply_to_id) : undefined,
+    quotedPostId: p.quoted_post_id ? String(p.quoted_post_id) : undefined,
+});
+
 const App: React.FC = () => {
     const [haikuPosts, setHaikuPosts] = useState<HaikuPost[]>([]);
     const [currentSort, setCurrentSort] = useState<'new'|'trending'>('new');
@@ -43,21 +60,7 @@ const App: React.FC = () => {
         
         try {
             const backendPosts = await apiFetchPosts(sort, pageNum);
-            const mapped: HaikuPost[] = backendPosts.map(p => ({
-                id: String(p.id),
-                author: p.author_name || '匿名',
-                authorAvatar: p.author_avatar || `https://picsum.photos/seed/${p.id}/100/100`,
-                line1: p.line1,
-                line2: p.line2,
-                line3: p.line3,
-                image: p.image,
-                reactions: mapCountsToReactions(p.sense_count, p.fukai_count, String(p.id)),
-                timestamp: p.created_at ? new Date(p.created_at).getTime() : Date.now(),
-                visibility: Visibility.Public,
-                isAiGenerated: false,
-                replyToId: p.reply_to_id ? String(p.reply_to_id) : undefined,
-                quotedPostId: p.quoted_post_id ? String(p.quoted_post_id) : undefined,
-            }));
+            const mapped: HaikuPost[] = backendPosts.map(mapBackendPost);
             
             if (append) {
                 setHaikuPosts(prev => [...prev, ...mapped]);
@@ -82,6 +85,43 @@ const App: React.FC = () => {
         loadPosts(currentSort, 1, false).catch(e => console.error('Failed to load posts', e));
     }, [currentSort, loadPosts]);
 
+    // SSEで新着投稿とリアクション数を反映（ポーリング不要）
+    useEffect(() => {
+        return subscribeEvents({
+            onPost: (p) => {
+                if (currentSort !== 'new') return;
+                // 新着投稿にはまだ誰もリアクションしていない（viewer_reactions は配信されない）
+                setHaikuPosts(prev => prev.some(x => x.id === String(p.id)) ? prev : [mapBackendPost({ ...p, viewer_reactions: [] }), ...prev]);
+            },
+            onReconnect: () => {
+                // 切断中に取りこぼしたイベントの代わりに1ページ目を取り直してマージ（読み込み済みの古いページは残す）
+                apiFetchPosts(currentSort, 1)
+                    .then(backendPosts => {
+                        const fresh = backendPosts.map(mapBackendPost);
+                        const freshIds = new Set(fresh.map(p => p.id));
+                        setHaikuPosts(prev => [...fresh, ...prev.filter(p => !freshIds.has(p.id))]);
+                    })
+                    .catch(e => console.error('Failed to refresh posts after reconnect', e));
+            },
+            onReactions: (counts) => {
+                const byId = new Map(counts.map(c => [String(c.post_id), c]));
+                setHaikuPosts(prev => prev.map(p => {
+                    const c = byId.get(p.id);
+                    if (!c) return p;
+                    // 他ユーザーのリアクションでは件数だけ更新し、閲覧者自身の isReacted は保持する
+                    return {
+                        ...p,
+                        reactions: p.reactions.map(r => {
+                            if (r.id === (ReactionId as any).Sense) return { ...r, count: c.sense_count };
+                            if (r.id === (ReactionId as any).Fukai) return { ...r, count: c.fukai_count };
+                            return r;
+                        }),
+                    };
+                }));
+            },
+        });
+    }, [currentSort]);
+
     const loadMorePosts = useCallback(() => {
         if (!loading && hasMore) {
             const nextPage = page + 1;
@@ -96,7 +136,11 @@ const App: React.FC = () => {
         loadPosts(currentSort, 1, false);
     }, [currentSort, loadPosts]);
 
-    const handleAddPost = useCallback(async (newPostData: Omit<HaikuPost, 'id' | 'timestamp' | 'author' | 'authorAvatar' | 'reactions'>) => {
+    // idempotencyKey: 再試行時は同じキーを渡し、サーバー側で重複投稿にならないようにする
+    const handleAddPost = useCallback(async (
+        newPostData: Omit<HaikuPost, 'id' | 'timestamp' | 'author' | 'authorAvatar' | 'reactions'>,
+        idempotencyKey: string = crypto.randomUUID(),
+    ) => {
         if (!currentUser) {
             showError("ログインが必要です。");
             return;
@@ -113,7 +157,7 @@ const App: React.FC = () => {
                     line2: newPostData.line2,
                     line3: newPostData.line3,
                     image: newPostData.image,
-                });
+                }, idempotencyKey);
             }
             // 引用の場合
             else if (newPostData.quotedPostId) {
@@ -124,7 +168,7 @@ const App: React.FC = () => {
                     line2: newPostData.line2,
                     line3: newPostData.line3,
                     image: newPostData.image,
-                });
+                }, idempotencyKey);
             }
             // 通常の投稿の場合
             else {
@@ -137,7 +181,7 @@ const App: React.FC = () => {
                     image: newPostData.image,
                     reply_to_id: undefined,
                     quoted_post_id: undefined,
-                });
+                }, idempotencyKey);
             }
             
             const newPost: HaikuPost = {
@@ -148,41 +192,40 @@ const App: React.FC = () => {
                 line2: created.line2,
                 line3: created.line3,
                 image: created.image,
-                reactions: mapCountsToReactions(created.sense_count, created.fukai_count, String(created.id)),
+                reactions: mapCountsToReactions(created.sense_count, created.fukai_count, String(created.id), created.viewer_reactions),
                 timestamp: created.created_at ? new Date(created.created_at).getTime() : Date.now(),
                 visibility: newPostData.visibility ?? Visibility.Public,
                 isAiGenerated: newPostData.isAiGenerated,
                 replyToId: created.reply_to_id ? String(created.reply_to_id) : undefined,
                 quotedPostId: created.quoted_post_id ? String(created.quoted_post_id) : undefined,
             };
-            setHaikuPosts(prevPosts => [newPost, ...prevPosts]);
+            // SSEの新着イベントがレスポンスより先に届いている場合があるため、同じIDは置き換える
+            setHaikuPosts(prevPosts => prevPosts.some(p => p.id === newPost.id)
+                ? prevPosts.map(p => p.id === newPost.id ? newPost : p)
+                : [newPost, ...prevPosts]);
             showSuccess('投稿が完了しました！');
         } catch (e) {
             console.error('Failed to create post via backend', e);
-            showError('投稿に失敗しました。しばらくしてから再度お試しください。');
+            showError('投稿に失敗しました。しばらくしてから再度お試しください。', undefined, () => handleAddPost(newPostData, idempotencyKey));
         }
     }, [currentUser]);
 
-    const storageKey = 'reactedByPost';
-
     const handleReaction = useCallback(async (postId: string, reactionId: ReactionId) => {
         try {
-            const store = JSON.parse(localStorage.getItem(storageKey) || '{}');
-            const key = `${postId}:${reactionId}`;
-            const isReacted = !!store[key];
+            // 付ける/外すは表示中の状態（サーバーの viewer_reactions 由来）で決める
+            const target = haikuPosts.find(p => p.id === postId);
+            const isReacted = !!target?.reactions.find(r => r.id === reactionId)?.isReacted;
             const kind = reactionId === (ReactionId as any).Sense ? 'sense' : 'fukai';
             const updated = isReacted ? await apiUnreact(parseInt(postId, 10), kind as any) : await apiReact(parseInt(postId, 10), kind as any);
-            store[key] = !isReacted;
-            localStorage.setItem(storageKey, JSON.stringify(store));
             setHaikuPosts(prev => prev.map(p => p.id === postId ? {
                 ...p,
-                reactions: mapCountsToReactions(updated.sense_count, updated.fukai_count, postId)
+                reactions: mapCountsToReactions(updated.sense_count, updated.fukai_count, postId, updated.viewer_reactions)
             } : p));
         } catch (e) {
             console.error('Failed to react', e);
             showError('リアクションの送信に失敗しました。');
         }
-    }, []);
+    }, [haikuPosts]);
 
     const requestSort = useCallback((sort: 'new'|'trending') => {
         setCurrentSort(sort);
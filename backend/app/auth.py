@@ -5,7 +5,7 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from .db import get_db
+from .db import get_read_db
 from .models import User
 from .schemas import TokenData
 
@@ -16,6 +16,9 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")  # 本番環境
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# 運用向けエンドポイント（ジョブ統計など）を許可するユーザーのメールアドレス（カンマ区切り、未設定なら誰も不可）
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
 # パスワードハッシュ化
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -55,7 +58,7 @@ def verify_token(token: str) -> Optional[TokenData]:
 
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> User:
     """現在のユーザーを取得"""
     credentials_exception = HTTPException(
@@ -76,7 +79,7 @@ def get_current_user(
 
 def get_current_user_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> Optional[User]:
     """現在のユーザーを取得（オプショナル）"""
     if credentials is None:
@@ -86,3 +89,9 @@ def get_current_user_optional(
         return get_current_user(credentials, db)
     except HTTPException:
         return None
+
+def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """運用者（ADMIN_EMAILS に含まれるユーザー）のみ許可"""
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return current_user
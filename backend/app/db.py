@@ -1,27 +1,107 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import time
+from typing import Dict, Generator, Optional
+
+from fastapi import Depends, Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 # 環境変数からデータベースURLを取得（Render用）
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./backend/app/app.db")
+# 読み取り専用レプリカ（未設定ならプライマリを使う）
+# ローカル検証例: sqlite:///file:backend/app/app.db?mode=ro&uri=true
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+# 自分の書き込み直後はこの秒数だけ読み取りもプライマリに固定する（レプリカ遅延対策）
+READ_AFTER_WRITE_SECONDS = float(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))
+
 
-# PostgreSQLの場合の接続設定
-if DATABASE_URL.startswith("postgresql"):
-    engine = create_engine(DATABASE_URL)
-else:
+def _create_engine(url: str):
+    # PostgreSQLの場合の接続設定
+    if url.startswith("postgresql"):
+        return create_engine(url)
     # SQLiteの場合（開発環境）
-    engine = create_engine(
-        DATABASE_URL,
+    return create_engine(
+        url,
         connect_args={"check_same_thread": False},
     )
+
+
+engine = _create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+read_engine = _create_engine(DATABASE_READ_URL) if DATABASE_READ_URL else engine
+ReadSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    if DATABASE_READ_URL
+    else SessionLocal
+)
+
 Base = declarative_base()
 
-# 依存性注入用
-from typing import Generator
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# 書き込みをコミットしたレスポンスに付ける時刻（UNIX秒）。クライアントが以降のリクエストで送り返すと、
+# どのワーカーでも READ_AFTER_WRITE_SECONDS の間は読み取りをプライマリに固定する
+LAST_WRITE_HEADER = "X-Last-Write"
+
+# ログインユーザー（トークンのsub） -> プライマリ固定の期限（プロセス内。ヘッダを送らないクライアント向けの補助）
+_recent_writers: Dict[str, float] = {}
+
+
+def _subject(request: Request) -> Optional[str]:
+    auth = request.headers.get("authorization", "")
+    if not auth.lower().startswith("bearer "):
+        return None
+    from .auth import verify_token  # auth は db に依存するためここで読み込む
+
+    token_data = verify_token(auth[7:].strip())
+    return token_data.email if token_data else None
 
-def get_db() -> Generator:
+
+def _mark_write(request: Request, response: Response) -> None:
+    response.headers[LAST_WRITE_HEADER] = f"{time.time():.3f}"
+    subject = _subject(request)
+    if subject is None:
+        return
+    now = time.monotonic()
+    if len(_recent_writers) > 10000:
+        for key, until in list(_recent_writers.items()):
+            if until < now:
+                _recent_writers.pop(key, None)
+    _recent_writers[subject] = now + READ_AFTER_WRITE_SECONDS
+
+
+def _is_pinned(request: Request) -> bool:
+    marker = request.headers.get(LAST_WRITE_HEADER)
+    if marker:
+        try:
+            if abs(time.time() - float(marker)) < READ_AFTER_WRITE_SECONDS:
+                return True
+        except ValueError:
+            pass
+    subject = _subject(request)
+    return subject is not None and _recent_writers.get(subject, 0) >= time.monotonic()
+
+
+# 依存性注入用
+def get_db(request: Request, response: Response) -> Generator:
+    """プライマリのセッション（書き込み用）。コミットしたら書き込み時刻をレスポンスに付け、読み取りをプライマリに固定する"""
     db = SessionLocal()
+    if DATABASE_READ_URL:
+        event.listen(db, "after_commit", lambda session: _mark_write(request, response))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(request: Request, primary: Session = Depends(get_db)) -> Generator:
+    """読み取り用セッション。レプリカ未設定・書き込みリクエスト・直近に自分が書き込んだ場合は
+    プライマリのセッションをそのまま返す（セッションは遅延接続のため余分な接続は張られない）"""
+    if read_engine is engine or request.method in WRITE_METHODS or _is_pinned(request):
+        yield primary
+        return
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from fastapi import Request
+
+
+Deliver = Callable[[dict], None]
+
+
+class LocalBackend:
+    """単一プロセス用バックエンド。publishしたイベントをそのまま配信する"""
+
+    def __init__(self) -> None:
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def stop(self) -> None:
+        self._deliver = None
+
+    async def publish(self, event: dict) -> None:
+        if self._deliver:
+            self._deliver(event)
+
+
+class RedisBackend:
+    """Redis Pub/Sub 経由で複数ワーカーにイベントを共有する（要 `pip install redis`）"""
+
+    channel = "sense-haiku:events"
+
+    def __init__(self, url: str) -> None:
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("EVENTS_BACKEND=redis requires the 'redis' package") from e
+        self._redis = aioredis.from_url(url)
+        self._task: Optional[asyncio.Task] = None
+        self._logger = logging.getLogger("events")
+
+    async def start(self, deliver: Deliver) -> None:
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self.channel)
+
+        async def listen() -> None:
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    deliver(json.loads(message["data"]))
+                except Exception:
+                    self._logger.exception("failed to deliver event from redis")
+
+        self._task = asyncio.create_task(listen())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+        await self._redis.close()
+
+    async def publish(self, event: dict) -> None:
+        await self._redis.publish(self.channel, json.dumps(event, ensure_ascii=False))
+
+
+class Subscriber:
+    """SSE接続1本分。送信待ちフレームを上限付きキューで保持する"""
+
+    def __init__(self, buffer_size: int) -> None:
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+
+class EventBroker:
+    """新着投稿・返信・リアクション数をSSE購読者へ配信するファンアウトブローカー。
+
+    - 各購読者は上限付きバッファを持ち、溢れた（読み出しが遅い）購読者は切断する。
+      クライアントは EventSource の自動再接続後に一覧を再取得すればよい。
+    - リアクションは投稿ごとに `coalesce_seconds` の窓で集約し、1イベントにまとめて送る。
+    - イベントの共有はバックエンド（local / redis）を差し替えて複数ワーカーに対応する。
+
+    環境変数
+    - EVENTS_BACKEND: "local" | "redis"（既定: local）
+    - REDIS_URL:      redisバックエンドの接続先（既定: redis://localhost:6379/0）
+    - EVENTS_BUFFER_SIZE: 購読者ごとのバッファ件数（既定100）
+    - EVENTS_COALESCE_MS: リアクション集約の窓（既定500ms）
+    """
+
+    keepalive_seconds = 15
+
+    def __init__(self) -> None:
+        self.buffer_size = int(os.getenv("EVENTS_BUFFER_SIZE", "100"))
+        self.coalesce_seconds = int(os.getenv("EVENTS_COALESCE_MS", "500")) / 1000
+        self._subscribers: Set[Subscriber] = set()
+        # post_id -> {"sense": 差分, "fukai": 差分, "sense_count": 最新値, "fukai_count": 最新値}
+        self._pending_reactions: Dict[int, Dict[str, int]] = {}
+        self._backend = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._logger = logging.getLogger("events")
+
+    def _make_backend(self):
+        kind = os.getenv("EVENTS_BACKEND", "local").lower()
+        if kind == "redis":
+            return RedisBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        return LocalBackend()
+
+    async def start(self) -> None:
+        self._backend = self._make_backend()
+        await self._backend.start(self._deliver)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+        if self._backend:
+            await self._backend.stop()
+
+    # --- 配信 ---------------------------------------------------------
+
+    def _deliver(self, event: dict) -> None:
+        """全購読者のバッファへ積む。フレームは1回だけエンコードして共有する"""
+        if not self._subscribers:
+            return
+        frame = f"event: {event['type']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+        for sub in list(self._subscribers):
+            try:
+                sub.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                sub.dropped = True
+                self._subscribers.discard(sub)
+                self._logger.info("dropped slow SSE subscriber (buffer full)")
+
+    async def publish(self, type: str, data) -> None:
+        if self._backend is None:
+            return
+        try:
+            await self._backend.publish({"type": type, "data": data})
+        except Exception:
+            # 配信失敗で書き込みAPIを失敗させない
+            self._logger.exception("failed to publish event: type=%s", type)
+
+    async def publish_post(self, post: dict) -> None:
+        """新着投稿/返信（PostOut相当のdict）を配信"""
+        await self.publish("reply" if post.get("reply_to_id") else "post", post)
+
+    def add_reaction(self, post_id: int, kind: str, delta: int, sense_count: int, fukai_count: int) -> None:
+        """リアクション変化を集約バッファに積む（送信は次のフラッシュ時）"""
+        pending = self._pending_reactions.setdefault(post_id, {"sense": 0, "fukai": 0})
+        pending[kind] += delta
+        pending["sense_count"] = sense_count
+        pending["fukai_count"] = fukai_count
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.coalesce_seconds)
+            if not self._pending_reactions:
+                continue
+            batch, self._pending_reactions = self._pending_reactions, {}
+            await self.publish(
+                "reactions",
+                [{"post_id": post_id, **counts} for post_id, counts in batch.items()],
+            )
+
+    # --- 購読 ---------------------------------------------------------
+
+    async def stream(self, request: Request) -> AsyncIterator[str]:
+        """SSEフレームを生成。切断・バッファ溢れで終了する"""
+        sub = Subscriber(self.buffer_size)
+        self._subscribers.add(sub)
+        try:
+            yield "retry: 3000\n\n"
+            while not sub.dropped:
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), timeout=self.keepalive_seconds)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if sub.dropped:
+                    break
+                yield frame
+        finally:
+            self._subscribers.discard(sub)
+
+
+event_broker = EventBroker()
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import IdempotencyKey, Post
+
+
+class IdempotencyStore:
+    """投稿作成APIの Idempotency-Key を idempotency_keys テーブルで管理する。
+
+    - key 行は投稿と同じトランザクションで挿入し、コミットされた投稿には必ず key が残る
+    - 同じ key の再送には元の投稿を返す（本文やエンドポイントが異なる場合は422）
+    - 同一プロセス内の同時リクエストは key ごとのロックで先行リクエストの完了を待つ。
+      別ワーカーの同時リクエストは主キーの一意制約で挿入が待たされ、先行がコミットすれば元の投稿を返す
+    - TTLを過ぎた key は無視し、定期的に削除する
+
+    環境変数
+    - IDEMPOTENCY_TTL_SECONDS: key の保持期間（既定86400秒）
+    """
+
+    max_key_length = 255
+    purge_interval_seconds = 60
+
+    def __init__(self) -> None:
+        self.ttl = timedelta(seconds=int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")))
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+        self._last_purge = 0.0
+
+    def scope(self, header: Optional[str], user_id: Optional[int]) -> Optional[str]:
+        """ヘッダ値をユーザー単位の key にする（ヘッダ無しならNone）"""
+        if header is None:
+            return None
+        header = header.strip()
+        if not header or len(header) > self.max_key_length:
+            raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
+        return f"{user_id if user_id is not None else 'anon'}:{header}"
+
+    @asynccontextmanager
+    async def lock(self, key: Optional[str]) -> AsyncIterator[None]:
+        """同じ key のリクエストをプロセス内で直列化する"""
+        if key is None:
+            yield
+            return
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._waiters[key] -= 1
+            if self._waiters[key] == 0:
+                del self._waiters[key]
+                self._locks.pop(key, None)
+
+    def begin(self, db: Session, key: Optional[str], endpoint: str, payload: str) -> Optional[Post]:
+        """処理済みの key なら元の投稿を返す。未使用なら key 行を挿入して確保し、Noneを返す"""
+        if key is None:
+            return None
+        fingerprint = hashlib.sha256(f"{endpoint}\n{payload}".encode("utf-8")).hexdigest()
+        self._purge(db)
+        replay = self._lookup(db, key, fingerprint)
+        if replay is not None:
+            return replay
+        db.add(IdempotencyKey(key=key, fingerprint=fingerprint))
+        try:
+            # 別ワーカーが同じ key を処理中なら、そのトランザクションが終わるまでここで待たされる
+            db.flush()
+        except IntegrityError:
+            db.rollback()
+            replay = self._lookup(db, key, fingerprint)
+            if replay is None:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+            return replay
+        return None
+
+    def complete(self, db: Session, key: Optional[str], post_id: int) -> None:
+        """作成した投稿を key に紐付ける（コミットは呼び出し側）"""
+        if key is None:
+            return
+        db.get(IdempotencyKey, key).post_id = post_id
+
+    def _lookup(self, db: Session, key: str, fingerprint: str) -> Optional[Post]:
+        row = db.get(IdempotencyKey, key)
+        if row is None:
+            return None
+        post = db.get(Post, row.post_id) if row.post_id is not None else None
+        if self._expired(row) or post is None:
+            # 期限切れ・投稿削除済みの key は使い直せるようにする
+            db.delete(row)
+            db.flush()
+            return None
+        if row.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was reused with a different request")
+        return post
+
+    def _expired(self, row: IdempotencyKey) -> bool:
+        created_at = row.created_at
+        if created_at is None:
+            return False
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return created_at < datetime.now(timezone.utc) - self.ttl
+
+    def _purge(self, db: Session) -> None:
+        now = time.monotonic()
+        if now - self._last_purge < self.purge_interval_seconds:
+            return
+        self._last_purge = now
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.created_at < datetime.now(timezone.utc) - self.ttl,
+        ).delete(synchronize_session=False)
+
+
+idempotency_store = IdempotencyStore()
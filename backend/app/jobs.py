@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .models import Job
+
+
+# (db, payloads) を受け取り、呼び出し側のトランザクション内で処理するハンドラ
+JobHandler = Callable[[Session, List[dict]], None]
+
+
+class JobQueue:
+    """DBテーブル（jobs）を使ったインプロセスの永続ジョブキュー。
+
+    - 書き込みAPIは `enqueue` で投稿と同じトランザクションにジョブを積む（コミットされた投稿は必ず処理される）
+    - ワーカータスクが pending のジョブをまとめて取り出し、種類ごとにハンドラへバッチで渡す
+    - ハンドラの処理とジョブの削除は同一トランザクション。バッチが失敗したら1件ずつ処理し直し、
+      失敗したジョブだけ指数バックオフで再試行、上限に達したら status='failed' で残す
+    - ワーカーが落ちて running のまま残ったジョブは `lock_timeout` 経過後に pending へ戻す
+
+    環境変数
+    - JOB_WORKERS:       ワーカータスク数（既定1）
+    - JOB_BATCH_SIZE:    1回に取り出す最大件数（既定100）
+    - JOB_POLL_MS:       キューが空のときのポーリング間隔（既定1000ms）
+    - JOB_MAX_ATTEMPTS:  最大試行回数（既定5）
+    """
+
+    lock_timeout = timedelta(minutes=5)
+
+    def __init__(self) -> None:
+        self.workers = int(os.getenv("JOB_WORKERS", "1"))
+        self.batch_size = int(os.getenv("JOB_BATCH_SIZE", "100"))
+        self.poll_seconds = int(os.getenv("JOB_POLL_MS", "1000")) / 1000
+        self.max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # メトリクス（このプロセス分）
+        self._processed = 0
+        self._failed = 0
+        self._latency_ms_total = 0.0
+        self._logger = logging.getLogger("jobs")
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    def enqueue(self, db: Session, kind: str, payload: dict) -> None:
+        """ジョブを呼び出し側のセッションに追加（コミットは呼び出し側）"""
+        db.add(Job(kind=kind, payload=json.dumps(payload, ensure_ascii=False)))
+
+    def wake(self) -> None:
+        """コミット直後に呼ぶと、ポーリングを待たずにワーカーが取り出しに行く"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    # --- ワーカー -----------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await asyncio.to_thread(self.run_once)
+            except Exception:
+                self._logger.exception("job worker iteration failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _claim(self, db: Session) -> List[Job]:
+        token = str(uuid.uuid4())
+        now = datetime.now(timezone.utc)
+        # ロックが切れた running ジョブを pending に戻す
+        db.query(Job).filter(
+            Job.status == "running",
+            Job.locked_at < now - self.lock_timeout,
+        ).update({Job.status: "pending", Job.locked_by: None}, synchronize_session=False)
+        # PostgreSQLでは SKIP LOCKED で複数ワーカーが同じジョブを取らないようにする（SQLiteでは無視される）
+        pending = (
+            select(Job.id)
+            .where(Job.status == "pending", Job.run_after <= now)
+            .order_by(Job.id.asc())
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        db.execute(
+            update(Job)
+            .where(Job.id.in_(pending))
+            .values(status="running", locked_by=token, locked_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return db.query(Job).filter(Job.locked_by == token).order_by(Job.id.asc()).all()
+
+    def run_once(self) -> int:
+        """1バッチ取り出して処理し、取り出した件数を返す"""
+        with SessionLocal() as db:
+            jobs = self._claim(db)
+            by_kind: Dict[str, List[Job]] = {}
+            for job in jobs:
+                by_kind.setdefault(job.kind, []).append(job)
+            for kind, group in by_kind.items():
+                self._run_group(db, kind, group)
+            return len(jobs)
+
+    def _run_group(self, db: Session, kind: str, group: List[Job]) -> None:
+        ids = [job.id for job in group]
+        created = [job.created_at for job in group]
+        try:
+            handler = self._handlers.get(kind)
+            if handler is None:
+                raise RuntimeError(f"no handler registered for job kind: {kind}")
+            handler(db, [json.loads(job.payload) for job in group])
+            db.query(Job).filter(Job.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            if len(group) > 1:
+                # バッチ内の1件が原因で全体を失敗させないよう、1件ずつやり直して失敗したものだけ再試行に回す
+                self._logger.info("job batch failed, retrying one by one: kind=%s count=%d error=%r", kind, len(group), e)
+                for job in group:
+                    self._run_group(db, kind, [job])
+                return
+            self._retry(db, group, repr(e))
+            self._logger.warning("job failed: kind=%s id=%d error=%r", kind, ids[0], e)
+            return
+
+        now = datetime.now(timezone.utc)
+        self._processed += len(group)
+        for created_at in created:
+            if created_at is not None:
+                if created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)
+                self._latency_ms_total += (now - created_at).total_seconds() * 1000
+
+    def _retry(self, db: Session, group: List[Job], error: str) -> None:
+        now = datetime.now(timezone.utc)
+        for job in db.query(Job).filter(Job.id.in_([j.id for j in group])).all():
+            job.attempts = (job.attempts or 0) + 1
+            job.last_error = error[:2000]
+            job.locked_by = None
+            if job.attempts >= self.max_attempts:
+                job.status = "failed"
+                self._failed += 1
+            else:
+                job.status = "pending"
+                job.run_after = now + timedelta(seconds=2 ** job.attempts)
+        db.commit()
+
+    # --- メトリクス ---------------------------------------------------
+
+    def stats(self, db: Session) -> dict:
+        """キュー深さ（status別件数）・最古のpendingの待ち時間・このプロセスの処理実績"""
+        depth = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+        oldest = db.query(func.min(Job.created_at)).filter(Job.status == "pending").scalar()
+        oldest_age = None
+        if oldest is not None:
+            if oldest.tzinfo is None:
+                oldest = oldest.replace(tzinfo=timezone.utc)
+            oldest_age = round((datetime.now(timezone.utc) - oldest).total_seconds(), 3)
+        return {
+            "depth": {status: depth.get(status, 0) for status in ("pending", "running", "failed")},
+            "oldest_pending_seconds": oldest_age,
+            "processed": self._processed,
+            "failed": self._failed,
+            "avg_latency_ms": round(self._latency_ms_total / self._processed, 1) if self._processed else None,
+        }
+
+
+job_queue = JobQueue()
@@ -1,22 +1,33 @@
-from fastapi import FastAPI, Depends, HTTPException, Path
+from fastapi import FastAPI, Depends, Header, HTTPException, Path, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Literal, Optional
 from datetime import timedelta
 import os
 
-from .db import Base, engine, get_db
-from .models import Post as PostModel, User as UserModel
+from .db import Base, engine, get_db, get_read_db, LAST_WRITE_HEADER
+from .models import Post as PostModel, User as UserModel, Notification as NotificationModel
 from .schemas import (
-    PostIn, PostOut, UserLogin, UserSignup, UserOut, Token,
+    PostIn, PostOut, UserLogin, UserSignup, UserOut, Token, SearchPage, UserPostsPage,
+    NotificationOut, NotificationReadIn, UnreadCount,
     HaikuGenerationRequest, HaikuGenerationResponse,
 )
 from .auth import (
     verify_password, get_password_hash, create_access_token, 
-    get_current_user, get_current_user_optional, ACCESS_TOKEN_EXPIRE_MINUTES
+    get_current_user, get_current_user_optional, get_current_admin, ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from .ai_service import ai_service
-from fugashi import Tagger
+from .yomi import tagger, token_reading
+from .search import search_index
+from .similar import similar_index
+from .events import event_broker
+from .notifications import notifier
+from .jobs import job_queue
+from .idempotency import idempotency_store
+from .reactions import add_reaction, remove_reaction, attach_viewer_reactions
+from . import user_stats
 
 app = FastAPI(title="Sense Haiku Backend", version="0.1.0")
 
@@ -32,15 +43,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 書き込み直後の読み取りをプライマリへ寄せるためのマーカー（クライアントが送り返す）
+    expose_headers=[LAST_WRITE_HEADER],
 )
 
-# 初回起動時にテーブル作成（PostgreSQLの場合のみ）
+# 起動時にテーブル作成（既存DBにも後から追加したテーブル・インデックスを作る。何度実行しても同じ）
 import os
-if os.getenv("DATABASE_URL"):
+def create_schema():
     Base.metadata.create_all(bind=engine)
+    # 既存テーブルに後から追加したインデックスも作成する（create_allは既存テーブルには作らない）
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    user_stats.backfill(engine)
 
-# 形態素解析器（起動時に一度初期化）
-tagger = Tagger()
+create_schema()
+# 全文検索インデックスは既存DBにも後付けで作成・バックフィルする
+search_index.ensure(engine)
+similar_index.ensure(engine)
+
+# 投稿後の副作用（ジョブキューのハンドラ）
+def handle_post_created(db: Session, payloads: List[dict]) -> None:
+    """検索索引・類似索引への登録"""
+    ids = [p["post_id"] for p in payloads]
+    posts = db.query(PostModel).filter(PostModel.id.in_(ids)).order_by(PostModel.id.asc()).all()
+    for post in posts:
+        search_index.index_post(db, post)
+    for post in posts:
+        similar_index.add(post.id, post.body)
+
+job_queue.register("post_created", handle_post_created)
+job_queue.register("notify", lambda db, items: notifier.write_batch(items, db))
+
+@app.on_event("startup")
+async def start_background_services():
+    await event_broker.start()
+    await notifier.start()
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await job_queue.stop()
+    await notifier.stop()
+    await event_broker.stop()
 
 @app.get("/health")
 async def health():
@@ -50,7 +95,9 @@ async def health():
 async def init_database():
     """データベースの初期化（開発用）"""
     try:
-        Base.metadata.create_all(bind=engine)
+        create_schema()
+        search_index.ensure(engine)
+        similar_index.ensure(engine)
         return {"message": "Database initialized successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database initialization failed: {str(e)}")
@@ -108,7 +155,7 @@ async def get_current_user_info(current_user: UserModel = Depends(get_current_us
 # 投稿エンドポイント（更新）
 @app.get("/api/posts", response_model=List[PostOut])
 async def list_posts(
-    db: Session = Depends(get_db), 
+    db: Session = Depends(get_read_db), 
     sort: Literal["new", "trending"] = "new",
     page: int = 1,
     limit: int = 20,
@@ -130,182 +177,380 @@ async def list_posts(
     # ページネーション適用
     q = q.offset(offset).limit(limit)
     
-    return q.all()
+    return attach_viewer_reactions(db, current_user.id if current_user else None, q.all())
+
+@app.get("/api/posts/{post_id}", response_model=PostOut)
+async def get_post(
+    post_id: int = Path(..., ge=1),
+    db: Session = Depends(get_read_db),
+    current_user: Optional[UserModel] = Depends(get_current_user_optional)
+):
+    """投稿詳細を取得"""
+    post = db.get(PostModel, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    attach_viewer_reactions(db, current_user.id if current_user else None, [post])
+    return post
+
+@app.get("/api/users/{user_id}/posts", response_model=UserPostsPage)
+async def list_user_posts(
+    user_id: int = Path(..., ge=1),
+    post_type: Literal["all", "posts", "replies", "quotes"] = Query("all", alias="type"),
+    limit: int = 20,
+    before_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    current_user: Optional[UserModel] = Depends(get_current_user_optional)
+):
+    """ユーザーの投稿一覧（新しい順、before_idでキーセットページング）と集計"""
+    if limit < 1 or limit > 100:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 100")
+    user = db.get(UserModel, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # (user_id, id) インデックスで user_id=? ORDER BY id DESC を引く
+    q = db.query(PostModel).filter(PostModel.user_id == user_id)
+    if post_type == "posts":
+        q = q.filter(PostModel.reply_to_id.is_(None), PostModel.quoted_post_id.is_(None))
+    elif post_type == "replies":
+        q = q.filter(PostModel.reply_to_id.isnot(None))
+    elif post_type == "quotes":
+        q = q.filter(PostModel.quoted_post_id.isnot(None))
+    if before_id is not None:
+        q = q.filter(PostModel.id < before_id)
+    rows = q.order_by(PostModel.id.desc()).limit(limit + 1).all()
+
+    next_before_id = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_before_id = rows[-1].id
+    items = attach_viewer_reactions(db, current_user.id if current_user else None, rows)
+    return {"user": user, "stats": user_stats.get(db, user_id), "items": items, "next_before_id": next_before_id}
 
 @app.post("/api/posts", response_model=PostOut)
 async def create_post(
     data: PostIn, 
     db: Session = Depends(get_db),
-    current_user: Optional[UserModel] = Depends(get_current_user_optional)
+    current_user: Optional[UserModel] = Depends(get_current_user_optional),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
-    try:
-        # ユーザーがログインしている場合はuser_idを設定
-        user_id = current_user.id if current_user else None
-        author_name = current_user.display_name if current_user else data.author_name
-        author_avatar = current_user.avatar_url if current_user else data.author_avatar
+    # 再送（同じIdempotency-Key）には元の投稿を返し、同時の重複は先行リクエストの完了を待つ
+    key = idempotency_store.scope(idempotency_key, current_user.id if current_user else None)
+    async with idempotency_store.lock(key):
+        replay = idempotency_store.begin(db, key, "posts", data.model_dump_json())
+        if replay is not None:
+            return attach_viewer_reactions(db, current_user.id if current_user else None, [replay])[0]
+        try:
+            # ユーザーがログインしている場合はuser_idを設定
+            user_id = current_user.id if current_user else None
+            author_name = current_user.display_name if current_user else data.author_name
+            author_avatar = current_user.avatar_url if current_user else data.author_avatar
         
-        if not author_name:
-            raise HTTPException(status_code=400, detail="Author name is required")
+            if not author_name:
+                raise HTTPException(status_code=400, detail="Author name is required")
         
-        row = PostModel(
-            author_name=author_name,
-            author_avatar=author_avatar,
-            user_id=user_id,
-            line1=data.line1,
-            line2=data.line2,
-            line3=data.line3,
-            image=data.image,
-            reply_to_id=data.reply_to_id,
-            quoted_post_id=data.quoted_post_id,
-        )
-        db.add(row)
-        db.commit()
-        db.refresh(row)
-        return row
-    except Exception as e:
-        print("create_post error:", repr(e))
-        db.rollback()
-        raise HTTPException(status_code=500, detail="failed to create post")
+            row = PostModel(
+                author_name=author_name,
+                author_avatar=author_avatar,
+                user_id=user_id,
+                line1=data.line1,
+                line2=data.line2,
+                line3=data.line3,
+                image=data.image,
+                reply_to_id=data.reply_to_id,
+                quoted_post_id=data.quoted_post_id,
+            )
+            db.add(row)
+            db.flush()
+            # 索引・通知は同じトランザクションでジョブとして積み、レスポンス後に処理する
+            job_queue.enqueue(db, "post_created", {"post_id": row.id})
+            user_stats.bump(db, user_id, posts=1)
+            idempotency_store.complete(db, key, row.id)
+            db.commit()
+            db.refresh(row)
+            job_queue.wake()
+            # viewer_reactions は閲覧者ごとの値なので配信しない
+            await event_broker.publish_post(PostOut.model_validate(row).model_dump(mode="json", exclude={"viewer_reactions"}))
+            return attach_viewer_reactions(db, user_id, [row])[0]
+        except Exception as e:
+            print("create_post error:", repr(e))
+            db.rollback()
+            raise HTTPException(status_code=500, detail="failed to create post")
 
 @app.post("/api/posts/{post_id}/react/{kind}", response_model=PostOut)
 async def react_post(
     post_id: int = Path(..., ge=1),
     kind: Literal["sense", "fukai"] = Path(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
 ):
+    """リアクションを付ける（付与済みなら何もしない）"""
     row = db.get(PostModel, post_id)
     if not row:
         raise HTTPException(status_code=404, detail="post not found")
-    if kind == "sense":
-        row.sense_count = (row.sense_count or 0) + 1
-    else:
-        row.fukai_count = (row.fukai_count or 0) + 1
-    db.add(row)
+    changed = add_reaction(db, current_user.id, post_id, kind)
+    if changed:
+        user_stats.bump(db, row.user_id, reactions=1)
     db.commit()
     db.refresh(row)
-    return row
+    if changed:
+        event_broker.add_reaction(post_id, kind, 1, row.sense_count, row.fukai_count)
+        notifier.notify("reaction", row.user_id, post_id, actor_id=current_user.id)
+    return attach_viewer_reactions(db, current_user.id, [row])[0]
 
 @app.delete("/api/posts/{post_id}/react/{kind}", response_model=PostOut)
 async def unreact_post(
     post_id: int = Path(..., ge=1),
     kind: Literal["sense", "fukai"] = Path(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
 ):
+    """リアクションを外す（付いていなければ何もしない）"""
     row = db.get(PostModel, post_id)
     if not row:
         raise HTTPException(status_code=404, detail="post not found")
-    if kind == "sense":
-        row.sense_count = max(0, (row.sense_count or 0) - 1)
-    else:
-        row.fukai_count = max(0, (row.fukai_count or 0) - 1)
-    db.add(row)
+    changed = remove_reaction(db, current_user.id, post_id, kind)
+    if changed:
+        user_stats.bump(db, row.user_id, reactions=-1)
     db.commit()
     db.refresh(row)
-    return row
+    if changed:
+        event_broker.add_reaction(post_id, kind, -1, row.sense_count, row.fukai_count)
+    return attach_viewer_reactions(db, current_user.id, [row])[0]
 
 @app.post("/api/posts/{post_id}/reply", response_model=PostOut)
 async def reply_to_post(
     data: PostIn,
     post_id: int = Path(..., ge=1),
     db: Session = Depends(get_db),
-    current_user: Optional[UserModel] = Depends(get_current_user_optional)
+    current_user: Optional[UserModel] = Depends(get_current_user_optional),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
     """投稿に返信する"""
-    try:
-        # 元の投稿が存在するかチェック
-        original_post = db.get(PostModel, post_id)
-        if not original_post:
-            raise HTTPException(status_code=404, detail="Original post not found")
+    # 再送（同じIdempotency-Key）には元の投稿を返し、同時の重複は先行リクエストの完了を待つ
+    key = idempotency_store.scope(idempotency_key, current_user.id if current_user else None)
+    async with idempotency_store.lock(key):
+        replay = idempotency_store.begin(db, key, f"reply:{post_id}", data.model_dump_json())
+        if replay is not None:
+            return attach_viewer_reactions(db, current_user.id if current_user else None, [replay])[0]
+        try:
+            # 元の投稿が存在するかチェック
+            original_post = db.get(PostModel, post_id)
+            if not original_post:
+                raise HTTPException(status_code=404, detail="Original post not found")
         
-        # ユーザーがログインしている場合はuser_idを設定
-        user_id = current_user.id if current_user else None
-        author_name = current_user.display_name if current_user else data.author_name
-        author_avatar = current_user.avatar_url if current_user else data.author_avatar
+            # ユーザーがログインしている場合はuser_idを設定
+            user_id = current_user.id if current_user else None
+            author_name = current_user.display_name if current_user else data.author_name
+            author_avatar = current_user.avatar_url if current_user else data.author_avatar
         
-        if not author_name:
-            raise HTTPException(status_code=400, detail="Author name is required")
+            if not author_name:
+                raise HTTPException(status_code=400, detail="Author name is required")
         
-        # 返信投稿を作成
-        reply_post = PostModel(
-            author_name=author_name,
-            author_avatar=author_avatar,
-            user_id=user_id,
-            line1=data.line1,
-            line2=data.line2,
-            line3=data.line3,
-            image=data.image,
-            reply_to_id=post_id,  # 返信先の投稿ID
-            quoted_post_id=None,
-        )
-        db.add(reply_post)
-        db.commit()
-        db.refresh(reply_post)
-        return reply_post
-    except Exception as e:
-        print("reply_to_post error:", repr(e))
-        db.rollback()
-        raise HTTPException(status_code=500, detail="failed to create reply")
+            # 返信投稿を作成
+            reply_post = PostModel(
+                author_name=author_name,
+                author_avatar=author_avatar,
+                user_id=user_id,
+                line1=data.line1,
+                line2=data.line2,
+                line3=data.line3,
+                image=data.image,
+                reply_to_id=post_id,  # 返信先の投稿ID
+                quoted_post_id=None,
+            )
+            db.add(reply_post)
+            db.flush()
+            # 索引・通知は同じトランザクションでジョブとして積み、レスポンス後に処理する
+            job_queue.enqueue(db, "post_created", {"post_id": reply_post.id})
+            user_stats.bump(db, user_id, posts=1)
+            idempotency_store.complete(db, key, reply_post.id)
+            notifier.enqueue(db, "reply", original_post.user_id, post_id, actor_id=user_id, source_post_id=reply_post.id)
+            db.commit()
+            db.refresh(reply_post)
+            job_queue.wake()
+            # viewer_reactions は閲覧者ごとの値なので配信しない
+            await event_broker.publish_post(PostOut.model_validate(reply_post).model_dump(mode="json", exclude={"viewer_reactions"}))
+            return attach_viewer_reactions(db, user_id, [reply_post])[0]
+        except Exception as e:
+            print("reply_to_post error:", repr(e))
+            db.rollback()
+            raise HTTPException(status_code=500, detail="failed to create reply")
 
 @app.post("/api/posts/{post_id}/quote", response_model=PostOut)
 async def quote_post(
     data: PostIn,
     post_id: int = Path(..., ge=1),
     db: Session = Depends(get_db),
-    current_user: Optional[UserModel] = Depends(get_current_user_optional)
+    current_user: Optional[UserModel] = Depends(get_current_user_optional),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
     """投稿を引用して新規投稿する"""
-    try:
-        # 引用元の投稿が存在するかチェック
-        quoted_post = db.get(PostModel, post_id)
-        if not quoted_post:
-            raise HTTPException(status_code=404, detail="Quoted post not found")
+    # 再送（同じIdempotency-Key）には元の投稿を返し、同時の重複は先行リクエストの完了を待つ
+    key = idempotency_store.scope(idempotency_key, current_user.id if current_user else None)
+    async with idempotency_store.lock(key):
+        replay = idempotency_store.begin(db, key, f"quote:{post_id}", data.model_dump_json())
+        if replay is not None:
+            return attach_viewer_reactions(db, current_user.id if current_user else None, [replay])[0]
+        try:
+            # 引用元の投稿が存在するかチェック
+            quoted_post = db.get(PostModel, post_id)
+            if not quoted_post:
+                raise HTTPException(status_code=404, detail="Quoted post not found")
         
-        # ユーザーがログインしている場合はuser_idを設定
-        user_id = current_user.id if current_user else None
-        author_name = current_user.display_name if current_user else data.author_name
-        author_avatar = current_user.avatar_url if current_user else data.author_avatar
+            # ユーザーがログインしている場合はuser_idを設定
+            user_id = current_user.id if current_user else None
+            author_name = current_user.display_name if current_user else data.author_name
+            author_avatar = current_user.avatar_url if current_user else data.author_avatar
         
-        if not author_name:
-            raise HTTPException(status_code=400, detail="Author name is required")
+            if not author_name:
+                raise HTTPException(status_code=400, detail="Author name is required")
         
-        # 引用投稿を作成
-        quote_post = PostModel(
-            author_name=author_name,
-            author_avatar=author_avatar,
-            user_id=user_id,
-            line1=data.line1,
-            line2=data.line2,
-            line3=data.line3,
-            image=data.image,
-            reply_to_id=None,
-            quoted_post_id=post_id,  # 引用元の投稿ID
-        )
-        db.add(quote_post)
-        db.commit()
-        db.refresh(quote_post)
-        return quote_post
-    except Exception as e:
-        print("quote_post error:", repr(e))
-        db.rollback()
-        raise HTTPException(status_code=500, detail="failed to create quote")
+            # 引用投稿を作成
+            quote_post = PostModel(
+                author_name=author_name,
+                author_avatar=author_avatar,
+                user_id=user_id,
+                line1=data.line1,
+                line2=data.line2,
+                line3=data.line3,
+                image=data.image,
+                reply_to_id=None,
+                quoted_post_id=post_id,  # 引用元の投稿ID
+            )
+            db.add(quote_post)
+            db.flush()
+            # 索引・通知は同じトランザクションでジョブとして積み、レスポンス後に処理する
+            job_queue.enqueue(db, "post_created", {"post_id": quote_post.id})
+            user_stats.bump(db, user_id, posts=1)
+            idempotency_store.complete(db, key, quote_post.id)
+            notifier.enqueue(db, "quote", quoted_post.user_id, post_id, actor_id=user_id, source_post_id=quote_post.id)
+            db.commit()
+            db.refresh(quote_post)
+            job_queue.wake()
+            # viewer_reactions は閲覧者ごとの値なので配信しない
+            await event_broker.publish_post(PostOut.model_validate(quote_post).model_dump(mode="json", exclude={"viewer_reactions"}))
+            return attach_viewer_reactions(db, user_id, [quote_post])[0]
+        except Exception as e:
+            print("quote_post error:", repr(e))
+            db.rollback()
+            raise HTTPException(status_code=500, detail="failed to create quote")
 
 @app.get("/api/posts/{post_id}/replies", response_model=List[PostOut])
 async def get_post_replies(
     post_id: int = Path(..., ge=1),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    current_user: Optional[UserModel] = Depends(get_current_user_optional)
 ):
     """投稿の返信一覧を取得"""
     replies = db.query(PostModel).filter(PostModel.reply_to_id == post_id).order_by(PostModel.created_at.asc()).all()
-    return replies
+    return attach_viewer_reactions(db, current_user.id if current_user else None, replies)
 
 @app.get("/api/posts/{post_id}/quotes", response_model=List[PostOut])
 async def get_post_quotes(
     post_id: int = Path(..., ge=1),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    current_user: Optional[UserModel] = Depends(get_current_user_optional)
 ):
     """投稿を引用した投稿一覧を取得"""
     quotes = db.query(PostModel).filter(PostModel.quoted_post_id == post_id).order_by(PostModel.created_at.desc()).all()
-    return quotes
+    return attach_viewer_reactions(db, current_user.id if current_user else None, quotes)
+
+@app.get("/api/posts/{post_id}/similar", response_model=List[PostOut])
+async def get_similar_posts(
+    post_id: int = Path(..., ge=1),
+    limit: int = 10,
+    db: Session = Depends(get_read_db),
+    current_user: Optional[UserModel] = Depends(get_current_user_optional)
+):
+    """本文・読みの文字n-gramが近い投稿を類似度順に取得"""
+    if limit < 1 or limit > 50:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 50")
+    post = db.get(PostModel, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    # 全件スキャンは件数に比例するため、イベントループ（SSE等）を止めないようスレッドで実行
+    similar = await run_in_threadpool(similar_index.similar_to, post_id, post.body, limit)
+    ids = [pid for pid, _ in similar]
+    if not ids:
+        return []
+    rows = {p.id: p for p in db.query(PostModel).filter(PostModel.id.in_(ids)).all()}
+    return attach_viewer_reactions(db, current_user.id if current_user else None, [rows[i] for i in ids if i in rows])
+
+# 通知エンドポイント
+@app.get("/api/notifications", response_model=List[NotificationOut])
+async def list_notifications(
+    limit: int = 20,
+    before_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    """自分宛ての通知を新しい順に取得（before_idでキーセットページング）"""
+    if limit < 1 or limit > 100:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 100")
+    q = (
+        db.query(NotificationModel)
+        .options(joinedload(NotificationModel.actor))
+        .filter(NotificationModel.user_id == current_user.id)
+    )
+    if before_id is not None:
+        q = q.filter(NotificationModel.id < before_id)
+    return q.order_by(NotificationModel.id.desc()).limit(limit).all()
+
+@app.get("/api/notifications/unread_count", response_model=UnreadCount)
+async def get_unread_count(
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    """未読数（キャッシュ済みカウンタを参照）"""
+    return {"unread": notifier.unread_count(db, current_user.id)}
+
+@app.post("/api/notifications/read", response_model=UnreadCount)
+async def mark_notifications_read(
+    data: NotificationReadIn,
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    """通知を既読にする（ids未指定なら全件）"""
+    return {"unread": notifier.mark_read(db, current_user.id, data.ids)}
+
+@app.get("/api/jobs/stats")
+async def get_job_stats(
+    db: Session = Depends(get_db),
+    admin: UserModel = Depends(get_current_admin)
+):
+    """ジョブキューの深さと処理レイテンシ（運用監視用、ADMIN_EMAILS のユーザーのみ）"""
+    return job_queue.stats(db)
+
+@app.get("/api/events")
+async def stream_events(request: Request):
+    """新着投稿・返信・リアクション数の変化をSSEで配信"""
+    return StreamingResponse(
+        event_broker.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/search", response_model=SearchPage)
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: Optional[UserModel] = Depends(get_current_user_optional)
+):
+    """投稿本文・読みのn-gram全文検索（関連度順、カーソルでページング）"""
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="Query is required")
+    if limit < 1 or limit > 100:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 100")
+    try:
+        items, next_cursor = search_index.search(db, q, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    items = attach_viewer_reactions(db, current_user.id if current_user else None, items)
+    return {"items": items, "next_cursor": next_cursor}
 
 # AIプロキシ: 認証任意（ログイン時はユーザー基準でレート制限、未ログインはIP）
 @app.post("/api/ai/haiku", response_model=HaikuGenerationResponse)
@@ -330,26 +575,6 @@ async def generate_haiku(
 # モーラ数を返す簡易API
 @app.post("/api/mora/count")
 async def count_mora(payload: dict):
-    def token_reading(tok) -> str:
-        # fugashi(unidic-lite)の特徴量から読みを取得
-        yomi = None
-        feat = getattr(tok, "feature", None)
-        if feat is not None:
-            try:
-                # pron / kana / pronBase / kanaBase を優先的に参照
-                yomi = (
-                    feat.get("pron")
-                    or feat.get("kana")
-                    or feat.get("pronBase")
-                    or feat.get("kanaBase")
-                )
-            except Exception:
-                try:
-                    yomi = getattr(feat, "pron", None) or getattr(feat, "kana", None)
-                except Exception:
-                    yomi = None
-        return yomi if yomi and yomi != "*" else tok.surface
-
     def count_line(s: str) -> int:
         # 読み（カナ/かな）に正規化してモーラ数を概算
         yomi_text = "".join(token_reading(t) for t in tagger(s))
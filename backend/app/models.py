@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index, Text
+from sqlalchemy.sql import func, false
 from sqlalchemy.orm import relationship
 from .db import Base
 
@@ -38,3 +38,91 @@ class Post(Base):
     
     # リレーションシップ
     user = relationship("User", back_populates="posts")
+
+    __table_args__ = (
+        # ユーザー別タイムライン（user_id=? ORDER BY id DESC）
+        Index("ix_posts_user_id_id", "user_id", "id"),
+        # 返信/引用一覧（reply_to_id=? / quoted_post_id=? ORDER BY created_at）
+        Index("ix_posts_reply_to_id_created_at", "reply_to_id", "created_at"),
+        Index("ix_posts_quoted_post_id_created_at", "quoted_post_id", "created_at"),
+    )
+
+    @property
+    def body(self) -> str:
+        """3行を改行で連結した本文（検索・類似度計算用）"""
+        return "\n".join(line for line in (self.line1, self.line2, self.line3) if line)
+
+class UserStats(Base):
+    """ユーザーごとの集計キャッシュ（プロフィール表示のたびにCOUNT/SUMしない）"""
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    post_count = Column(Integer, nullable=False, server_default="0")
+    reactions_received = Column(Integer, nullable=False, server_default="0")
+
+class Reaction(Base):
+    """誰がどの投稿にリアクションしたか（1ユーザー・1投稿・1種類につき1行）"""
+    __tablename__ = "reactions"
+
+    # (user_id, post_id) 先頭の主キーで「閲覧者のリアクション」を IN でまとめて引ける
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), primary_key=True)
+    kind = Column(String(10), primary_key=True)  # sense | fukai
+
+class Notification(Base):
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # 通知の受け手
+    actor_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # 操作したユーザー（リアクションは匿名可）
+    kind = Column(String(20), nullable=False)  # reply | quote | reaction
+    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)  # 対象となった受け手の投稿
+    source_post_id = Column(Integer, ForeignKey("posts.id"), nullable=True)  # 返信/引用した投稿
+    count = Column(Integer, nullable=False, server_default="1")  # 集約されたリアクション数
+    is_read = Column(Boolean, nullable=False, server_default=false())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    actor = relationship("User", foreign_keys=[actor_id])
+
+    __table_args__ = (
+        # 一覧（新しい順）と未読の集約対象探索用
+        Index("ix_notifications_user_id_id", "user_id", "id"),
+        Index("ix_notifications_post_id_kind", "post_id", "kind"),
+    )
+
+class NotificationCounter(Base):
+    """ユーザーごとの未読数キャッシュ（ヘッダーのバッジ用にCOUNTを避ける）"""
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    unread = Column(Integer, nullable=False, server_default="0")
+
+class Job(Base):
+    """投稿後の副作用を非同期に処理するジョブ（DB永続化、再起動後も残る）"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String(20), nullable=False, server_default="pending")  # pending | running | failed
+    attempts = Column(Integer, nullable=False, server_default="0")
+    run_after = Column(DateTime(timezone=True), server_default=func.now())
+    locked_by = Column(String(36), nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # 取り出し（status='pending' AND run_after<=now ORDER BY id）用
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
+
+
+class IdempotencyKey(Base):
+    """投稿作成APIの Idempotency-Key（再送時に同じ投稿を返す。TTL経過後に削除）"""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(300), primary_key=True)  # "<ユーザーID or anon>:<ヘッダ値>"
+    fingerprint = Column(String(64), nullable=False)  # エンドポイント＋リクエスト本文のSHA-256
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .jobs import job_queue
+from .models import Notification, NotificationCounter
+
+
+class Notifier:
+    """返信・引用・リアクション通知の非同期生成。
+
+    - 返信・引用は `enqueue` で投稿と同じトランザクションに notify ジョブを積み、
+      ジョブキューがまとめて書き込む（投稿がコミットされれば通知も失われない）。
+    - リアクションは `notify` でメモリ上のキューに積むだけで、DBへの書き込みは
+      バックグラウンドタスクがまとめて1トランザクションで行う（ホットパスに書き込みを足さない）。
+    - リアクションは同じ投稿への未読通知が `reaction_window` 内にあれば count を加算し、1件に集約する。
+    - 未読数は notification_counters に保持し、作成/既読時に増減させる（COUNTを走らせない）。
+
+    環境変数
+    - NOTIFY_BATCH_SIZE:        1回に書き込む最大件数（既定200）
+    - NOTIFY_FLUSH_MS:          バッチを待つ最大時間（既定500ms）
+    - NOTIFY_REACTION_WINDOW_SECONDS: リアクション集約の窓（既定600秒）
+    """
+
+    def __init__(self) -> None:
+        self.batch_size = int(os.getenv("NOTIFY_BATCH_SIZE", "200"))
+        self.flush_seconds = int(os.getenv("NOTIFY_FLUSH_MS", "500")) / 1000
+        self.reaction_window = timedelta(seconds=int(os.getenv("NOTIFY_REACTION_WINDOW_SECONDS", "600")))
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._logger = logging.getLogger("notifications")
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+        # 残りを書き出してから終了
+        if self._queue and not self._queue.empty():
+            await asyncio.to_thread(self.write_batch, self._drain())
+
+    @staticmethod
+    def _item(
+        kind: str,
+        user_id: Optional[int],
+        post_id: int,
+        actor_id: Optional[int],
+        source_post_id: Optional[int],
+    ) -> Optional[dict]:
+        # 匿名投稿や自分自身への操作は通知しない
+        if user_id is None or user_id == actor_id:
+            return None
+        return {
+            "kind": kind,
+            "user_id": user_id,
+            "post_id": post_id,
+            "actor_id": actor_id,
+            "source_post_id": source_post_id,
+        }
+
+    def enqueue(
+        self,
+        db: Session,
+        kind: str,
+        user_id: Optional[int],
+        post_id: int,
+        actor_id: Optional[int] = None,
+        source_post_id: Optional[int] = None,
+    ) -> None:
+        """通知を notify ジョブとして呼び出し側のトランザクションに積む"""
+        item = self._item(kind, user_id, post_id, actor_id, source_post_id)
+        if item:
+            job_queue.enqueue(db, "notify", item)
+
+    def notify(
+        self,
+        kind: str,
+        user_id: Optional[int],
+        post_id: int,
+        actor_id: Optional[int] = None,
+        source_post_id: Optional[int] = None,
+    ) -> None:
+        """通知をメモリ上のキューに積む（リアクション用）"""
+        item = self._item(kind, user_id, post_id, actor_id, source_post_id)
+        if item and self._queue is not None:
+            self._queue.put_nowait(item)
+
+    def _drain(self) -> List[dict]:
+        items = []
+        while not self._queue.empty() and len(items) < self.batch_size:
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            # 最初の1件から flush_seconds 待って溜まった分をまとめる
+            await asyncio.sleep(self.flush_seconds)
+            batch = [first] + self._drain()
+            try:
+                await asyncio.to_thread(self.write_batch, batch)
+            except Exception:
+                self._logger.exception("failed to write notifications: %d items", len(batch))
+
+    # --- 書き込み -----------------------------------------------------
+
+    def write_batch(self, items: List[dict], db: Optional[Session] = None) -> None:
+        """通知をまとめて書き込む（リアクションは投稿単位に集約）"""
+        if not items:
+            return
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            self._write(db, items)
+            if own_session:
+                db.commit()
+        except Exception:
+            if own_session:
+                db.rollback()
+            raise
+        finally:
+            if own_session:
+                db.close()
+
+    def _write(self, db: Session, items: List[dict]) -> None:
+        new_rows: List[Notification] = []
+        # (user_id, post_id) -> 件数
+        reactions: Dict[Tuple[int, int], int] = {}
+        for item in items:
+            if item["kind"] == "reaction":
+                key = (item["user_id"], item["post_id"])
+                reactions[key] = reactions.get(key, 0) + 1
+            else:
+                new_rows.append(Notification(**item))
+
+        if reactions:
+            since = datetime.now(timezone.utc) - self.reaction_window
+            post_ids = {post_id for _, post_id in reactions}
+            open_rows = (
+                db.query(Notification)
+                .filter(
+                    Notification.kind == "reaction",
+                    Notification.post_id.in_(post_ids),
+                    Notification.is_read.is_(False),
+                    Notification.created_at >= since,
+                )
+                .all()
+            )
+            existing = {(n.user_id, n.post_id): n for n in open_rows}
+            for (user_id, post_id), n in reactions.items():
+                row = existing.get((user_id, post_id))
+                if row:
+                    row.count = (row.count or 0) + n
+                else:
+                    new_rows.append(Notification(kind="reaction", user_id=user_id, post_id=post_id, count=n))
+
+        db.add_all(new_rows)
+        unread: Dict[int, int] = {}
+        for row in new_rows:
+            unread[row.user_id] = unread.get(row.user_id, 0) + 1
+        for user_id, n in unread.items():
+            self._bump_unread(db, user_id, n)
+
+    @staticmethod
+    def _bump_unread(db: Session, user_id: int, n: int) -> None:
+        db.execute(
+            text(
+                "INSERT INTO notification_counters (user_id, unread) VALUES (:user_id, :n)"
+                " ON CONFLICT (user_id) DO UPDATE"
+                " SET unread = notification_counters.unread + excluded.unread"
+            ),
+            {"user_id": user_id, "n": n},
+        )
+
+    # --- 読み出し -----------------------------------------------------
+
+    @staticmethod
+    def unread_count(db: Session, user_id: int) -> int:
+        counter = db.get(NotificationCounter, user_id)
+        return counter.unread if counter else 0
+
+    def mark_read(self, db: Session, user_id: int, ids: Optional[List[int]] = None) -> int:
+        """既読にして未読数を減らす。ids未指定なら全件。更新後の未読数を返す"""
+        q = db.query(Notification).filter(
+            Notification.user_id == user_id,
+            Notification.is_read.is_(False),
+        )
+        if ids is not None:
+            q = q.filter(Notification.id.in_(ids))
+        changed = q.update({Notification.is_read: True}, synchronize_session=False)
+        if changed:
+            # 実際に既読にした件数だけ1文で減らす（同時に積まれた通知の加算を上書きしない）
+            db.execute(
+                text(
+                    "UPDATE notification_counters"
+                    " SET unread = CASE WHEN unread > :n THEN unread - :n ELSE 0 END"
+                    " WHERE user_id = :user_id"
+                ),
+                {"user_id": user_id, "n": changed},
+            )
+        db.commit()
+        return self.unread_count(db, user_id)
+
+
+notifier = Notifier()
@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .models import Post, Reaction
+
+# kind -> posts のカウンタ列（SQLに埋め込むためホワイトリストで限定）
+COUNTER_COLUMNS = {"sense": "sense_count", "fukai": "fukai_count"}
+
+
+def add_reaction(db: Session, user_id: int, post_id: int, kind: str) -> bool:
+    """リアクションを付ける。既に付いていれば何もしない（冪等）。変化があれば True"""
+    col = COUNTER_COLUMNS[kind]
+    params = {"user_id": user_id, "post_id": post_id, "kind": kind}
+    if db.get_bind().dialect.name == "postgresql":
+        # 挿入できた場合だけカウンタを進める（1文で実行）
+        result = db.execute(
+            text(
+                "WITH ins AS ("
+                " INSERT INTO reactions (user_id, post_id, kind) VALUES (:user_id, :post_id, :kind)"
+                " ON CONFLICT DO NOTHING RETURNING 1)"
+                f" UPDATE posts SET {col} = {col} + 1"
+                " WHERE id = :post_id AND EXISTS (SELECT 1 FROM ins)"
+            ),
+            params,
+        )
+        return result.rowcount > 0
+    inserted = db.execute(
+        text("INSERT OR IGNORE INTO reactions (user_id, post_id, kind) VALUES (:user_id, :post_id, :kind)"),
+        params,
+    ).rowcount
+    if inserted:
+        db.execute(text(f"UPDATE posts SET {col} = {col} + 1 WHERE id = :post_id"), params)
+    return inserted > 0
+
+
+def remove_reaction(db: Session, user_id: int, post_id: int, kind: str) -> bool:
+    """リアクションを外す。付いていなければ何もしない（冪等）。変化があれば True"""
+    col = COUNTER_COLUMNS[kind]
+    params = {"user_id": user_id, "post_id": post_id, "kind": kind}
+    if db.get_bind().dialect.name == "postgresql":
+        result = db.execute(
+            text(
+                "WITH del AS ("
+                " DELETE FROM reactions WHERE user_id = :user_id AND post_id = :post_id AND kind = :kind"
+                " RETURNING 1)"
+                f" UPDATE posts SET {col} = GREATEST({col} - 1, 0)"
+                " WHERE id = :post_id AND EXISTS (SELECT 1 FROM del)"
+            ),
+            params,
+        )
+        return result.rowcount > 0
+    deleted = db.execute(
+        text("DELETE FROM reactions WHERE user_id = :user_id AND post_id = :post_id AND kind = :kind"),
+        params,
+    ).rowcount
+    if deleted:
+        db.execute(text(f"UPDATE posts SET {col} = MAX({col} - 1, 0) WHERE id = :post_id"), params)
+    return deleted > 0
+
+
+def attach_viewer_reactions(db: Session, viewer_id: Optional[int], posts: Iterable[Post]) -> List[Post]:
+    """ページ内の全投稿について閲覧者のリアクションを1回の IN クエリで引き、
+    各投稿の `viewer_reactions` に設定する（PostOut が読み出す）"""
+    posts = list(posts)
+    if viewer_id is None or not posts:
+        return posts
+    rows = (
+        db.query(Reaction.post_id, Reaction.kind)
+        .filter(Reaction.user_id == viewer_id, Reaction.post_id.in_({p.id for p in posts}))
+        .all()
+    )
+    by_post: Dict[int, List[str]] = {}
+    for post_id, kind in rows:
+        by_post.setdefault(post_id, []).append(kind)
+    for post in posts:
+        post.viewer_reactions = sorted(by_post.get(post.id, []))
+    return posts
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 # 認証関連スキーマ
 class UserLogin(BaseModel):
@@ -48,10 +48,47 @@ class PostOut(PostIn):
     fukai_count: int = 0
     created_at: Optional[datetime] = None
     user: Optional[UserOut] = None  # ユーザー情報を含める
+    viewer_reactions: Optional[List[str]] = None  # 閲覧者が付けたリアクション（未ログイン・未取得時はNone）
 
     class Config:
         from_attributes = True
 
+# ユーザー別タイムライン
+class UserStatsOut(BaseModel):
+    post_count: int = 0
+    reactions_received: int = 0
+
+class UserPostsPage(BaseModel):
+    user: UserOut
+    stats: UserStatsOut
+    items: List[PostOut]
+    next_before_id: Optional[int] = None
+
+# 検索結果（キーセットページネーション）
+class SearchPage(BaseModel):
+    items: List[PostOut]
+    next_cursor: Optional[str] = None
+
+# 通知関連
+class NotificationOut(BaseModel):
+    id: int
+    kind: str  # reply | quote | reaction
+    post_id: int
+    source_post_id: Optional[int] = None
+    count: int = 1
+    is_read: bool = False
+    created_at: Optional[datetime] = None
+    actor: Optional[UserOut] = None
+
+    class Config:
+        from_attributes = True
+
+class NotificationReadIn(BaseModel):
+    ids: Optional[List[int]] = None  # 未指定なら全件既読
+
+class UnreadCount(BaseModel):
+    unread: int
+
 # AIプロキシ関連
 class HaikuGenerationRequest(BaseModel):
     text: str
@@ -0,0 +1,210 @@
+import base64
+import logging
+from typing import List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .models import Post
+from .yomi import reading
+
+
+class SearchIndex:
+    """投稿本文のn-gram全文検索インデックス。
+
+    日本語は分かち書きされないため、単語ではなく3文字単位(trigram)で索引する。
+    本文に加えてfugashiで得た読み（ひらがな）も索引し、漢字/かな表記ゆれでもヒットさせる。
+
+    - SQLite:     FTS5仮想テーブル `posts_fts`（tokenize='trigram'、bm25でランキング）
+    - PostgreSQL: `post_search` テーブル + pg_trgm GINインデックス（similarityでランキング）
+
+    投稿作成時に積まれる post_created ジョブから `index_post` を呼び、posts と同期させる。
+    """
+
+    # trigramで索引できる最短クエリ長（これ未満は索引テーブルを走査する）
+    min_ngram = 3
+    backfill_batch = 1000
+
+    def __init__(self) -> None:
+        self._logger = logging.getLogger("search")
+
+    def ensure(self, engine: Engine) -> None:
+        """索引テーブルを作成し、未索引の既存投稿をバックフィルする"""
+        if not inspect(engine).has_table("posts"):
+            # posts未作成（/api/init-db 前）の場合は何もしない
+            return
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS post_search ("
+                    " post_id INTEGER PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,"
+                    " body TEXT NOT NULL,"
+                    " reading TEXT NOT NULL)"
+                ))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_post_search_body_trgm"
+                    " ON post_search USING gin (body gin_trgm_ops)"
+                ))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_post_search_reading_trgm"
+                    " ON post_search USING gin (reading gin_trgm_ops)"
+                ))
+            else:
+                conn.execute(text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts"
+                    " USING fts5(body, reading, tokenize='trigram')"
+                ))
+        self._backfill(engine)
+
+    def _backfill(self, engine: Engine) -> None:
+        # 作成後はジョブで索引されるため、ここでは索引導入前の投稿を拾う（ID昇順で再開可能）
+        max_sql = (
+            "SELECT COALESCE(MAX(post_id), 0) FROM post_search"
+            if engine.dialect.name == "postgresql"
+            else "SELECT COALESCE(MAX(rowid), 0) FROM posts_fts"
+        )
+        with Session(engine) as db:
+            last_id = db.execute(text(max_sql)).scalar() or 0
+            total = 0
+            while True:
+                batch = (
+                    db.query(Post)
+                    .filter(Post.id > last_id)
+                    .order_by(Post.id.asc())
+                    .limit(self.backfill_batch)
+                    .all()
+                )
+                if not batch:
+                    break
+                for post in batch:
+                    self.index_post(db, post)
+                db.commit()
+                last_id = batch[-1].id
+                total += len(batch)
+            if total:
+                self._logger.info("search index backfilled: %d posts", total)
+
+    def index_post(self, db: Session, post: Post) -> None:
+        """投稿を索引に追加（呼び出し側のトランザクション内で実行）。既に索引済みなら置き換える"""
+        body = post.body
+        params = {"id": post.id, "body": body, "reading": reading(body)}
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(
+                text(
+                    "INSERT INTO post_search (post_id, body, reading) VALUES (:id, :body, :reading)"
+                    " ON CONFLICT (post_id) DO UPDATE SET body = excluded.body, reading = excluded.reading"
+                ),
+                params,
+            )
+        else:
+            db.execute(text("DELETE FROM posts_fts WHERE rowid = :id"), params)
+            db.execute(
+                text("INSERT INTO posts_fts (rowid, body, reading) VALUES (:id, :body, :reading)"),
+                params,
+            )
+
+    # カーソルは (score, post_id) のキーセット。scoreは昇順（小さいほど高関連）
+    @staticmethod
+    def encode_cursor(score: float, post_id: int) -> str:
+        raw = f"{score!r}:{post_id}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[float, int]:
+        """不正なカーソルは ValueError"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            score, post_id = base64.urlsafe_b64decode(padded).decode().split(":")
+            return float(score), int(post_id)
+        except Exception as e:
+            raise ValueError("invalid cursor") from e
+
+    def _hits_sql(self, dialect: str, terms: List[Tuple[str, str]]) -> Tuple[str, dict]:
+        """(post_id, score) を返すサブクエリ。terms は (語, 読み) のリストで、全語を含む投稿に一致する"""
+        params: dict = {}
+        if dialect == "postgresql":
+            def like(s: str) -> str:
+                escaped = s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                return f"%{escaped}%"
+            conds = []
+            for i, (q, r) in enumerate(terms):
+                conds.append(f"(body LIKE :q_like{i} OR reading LIKE :r_like{i})")
+                params.update({f"q_like{i}": like(q), f"r_like{i}": like(r)})
+            params.update({"q": " ".join(q for q, _ in terms), "r": " ".join(r for _, r in terms)})
+            sql = (
+                "SELECT post_id, -GREATEST(similarity(body, :q), similarity(reading, :r)) AS score"
+                " FROM post_search"
+                f" WHERE {' AND '.join(conds)}"
+            )
+            return sql, params
+
+        def phrase(s: str) -> str:
+            return '"' + s.replace('"', '""') + '"'
+        matches = []
+        scans = []
+        for i, (q, r) in enumerate(terms):
+            cols = []
+            if len(q) >= self.min_ngram:
+                cols.append(f"body : {phrase(q)}")
+            if len(r) >= self.min_ngram:
+                cols.append(f"reading : {phrase(r)}")
+            if cols:
+                matches.append("(" + " OR ".join(cols) + ")")
+            else:
+                # trigram未満はMATCHできないため行ごとに部分一致で絞る
+                scans.append(f"(instr(body, :q{i}) > 0 OR instr(reading, :r{i}) > 0)")
+                params.update({f"q{i}": q, f"r{i}": r})
+
+        if not matches:
+            sql = (
+                "SELECT rowid AS post_id, 0.0 AS score FROM posts_fts"
+                f" WHERE {' AND '.join(scans)}"
+            )
+            return sql, params
+        params["match"] = " AND ".join(matches)
+        sql = (
+            "SELECT rowid AS post_id, bm25(posts_fts) AS score FROM posts_fts"
+            " WHERE posts_fts MATCH :match" + "".join(f" AND {c}" for c in scans)
+        )
+        return sql, params
+
+    def search(
+        self,
+        db: Session,
+        q: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Post], Optional[str]]:
+        """関連度順に投稿を検索し、(投稿リスト, 次ページのカーソル) を返す"""
+        # 空白区切りの各語をAND条件にする（読みは語ごとに求める）
+        terms = [(t, reading(t) or t) for t in q.split()]
+        hits_sql, params = self._hits_sql(db.get_bind().dialect.name, terms)
+
+        where = ""
+        if cursor:
+            score, post_id = self.decode_cursor(cursor)
+            where = " WHERE score > :c_score OR (score = :c_score AND post_id < :c_id)"
+            params.update({"c_score": score, "c_id": post_id})
+        params["limit"] = limit + 1
+
+        rows = db.execute(
+            text(
+                f"SELECT post_id, score FROM ({hits_sql}) AS hits{where}"
+                " ORDER BY score ASC, post_id DESC LIMIT :limit"
+            ),
+            params,
+        ).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor(rows[-1].score, rows[-1].post_id)
+
+        ids = [row.post_id for row in rows]
+        posts = {p.id: p for p in db.query(Post).filter(Post.id.in_(ids)).all()} if ids else {}
+        return [posts[i] for i in ids if i in posts], next_cursor
+
+
+search_index = SearchIndex()
@@ -0,0 +1,252 @@
+import fcntl
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .models import Post
+from .yomi import reading
+
+
+class SimilarIndex:
+    """「似ている句」推薦用のインプロセス・ベクトル索引。
+
+    本文と読み（ひらがな）の文字2/3-gramを feature hashing で `dim` 次元に畳み込み、
+    TF-IDF重み付け＋L2正規化したベクトルを保持する。近傍検索は全件の内積（コサイン）を
+    NumPyで一括計算して上位k件を取る。
+
+    ベクトルはメモリマップファイルに追記するため、複数ワーカーで同じページキャッシュを共有でき、
+    再起動時も再構築は不要（未登録の投稿だけバックフィル）。追記は flock で直列化する。
+    IDFは追記時点の文書頻度で確定させる（既存ベクトルは再計算しない）。
+
+    環境変数
+    - SIMILAR_INDEX_DIR: 索引ファイルの保存先（既定: backend/app/similar_index）
+    - SIMILAR_DIM:       ベクトル次元数（既定128。変更すると索引を作り直す）
+    - SIMILAR_CACHE_TTL_SECONDS: 投稿ごとの推薦結果キャッシュの有効秒数（既定600）
+    """
+
+    # stats.i64 のヘッダ: [件数, 容量, 次元数] の後ろに次元ごとの文書頻度(df)が続く
+    header_size = 3
+    initial_capacity = 1024
+    ngram_sizes = (2, 3)
+    cache_size = 1024
+
+    def __init__(self) -> None:
+        default_dir = Path(__file__).resolve().parent / "similar_index"
+        self.path = Path(os.getenv("SIMILAR_INDEX_DIR", str(default_dir)))
+        self.dim = int(os.getenv("SIMILAR_DIM", "128"))
+
+        self._stats: Optional[np.memmap] = None
+        # (ids, vectors)。拡張時は組ごと差し替え、ロックを取らない検索からも一貫した組が見えるようにする
+        self._rows: Optional[Tuple[np.memmap, np.memmap]] = None
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger("similar")
+
+        # 全件スキャンは件数に比例するため、投稿ごとの結果をTTL付きLRUで保持する
+        # key: (post_id, limit) -> (expires_at, results)
+        self.cache_ttl_seconds = int(os.getenv("SIMILAR_CACHE_TTL_SECONDS", "600"))
+        self._cache: "OrderedDict[Tuple[int, int], Tuple[float, List[Tuple[int, float]]]]" = OrderedDict()
+        # 検索はスレッドプールから並行に呼ばれるためキャッシュ操作だけ排他する
+        self._cache_lock = threading.Lock()
+
+    # --- ファイル管理 -------------------------------------------------
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """プロセス内（threading）とプロセス間（flock）の排他"""
+        with self._lock:
+            with open(self.path / "lock", "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _map_stats(self) -> None:
+        self._stats = np.memmap(
+            self.path / "stats.i64", dtype=np.int64, mode="r+", shape=(self.header_size + self.dim,)
+        )
+
+    def _map_rows(self) -> None:
+        capacity = int(self._stats[1])
+        ids = np.memmap(self.path / "ids.i64", dtype=np.int64, mode="r+", shape=(capacity,))
+        vectors = np.memmap(
+            self.path / "vectors.f32", dtype=np.float32, mode="r+", shape=(capacity, self.dim)
+        )
+        self._rows = (ids, vectors)
+
+    def _create_files(self) -> None:
+        stats = np.zeros(self.header_size + self.dim, dtype=np.int64)
+        stats[1] = self.initial_capacity
+        stats[2] = self.dim
+        stats.tofile(self.path / "stats.i64")
+        self._resize_file(self.path / "ids.i64", self.initial_capacity * 8)
+        self._resize_file(self.path / "vectors.f32", self.initial_capacity * self.dim * 4)
+
+    @staticmethod
+    def _resize_file(path: Path, size: int) -> None:
+        with open(path, "a+b") as f:
+            f.truncate(size)
+
+    def _grow(self) -> None:
+        """容量を倍にしてファイルを拡張（ロック保持中に呼ぶ）"""
+        capacity = int(self._stats[1]) * 2
+        ids, vectors = self._rows
+        vectors.flush()
+        ids.flush()
+        # 旧マップは検索中の読み手が参照していても有効（ファイルは伸ばすだけ）
+        self._resize_file(self.path / "ids.i64", capacity * 8)
+        self._resize_file(self.path / "vectors.f32", capacity * self.dim * 4)
+        self._stats[1] = capacity
+        self._map_rows()
+
+    def _refresh(self) -> None:
+        """他ワーカーがファイルを拡張していたら再マップ"""
+        if self._rows is None or int(self._stats[1]) != self._rows[0].shape[0]:
+            self._map_rows()
+
+    def open(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._locked():
+            stats_path = self.path / "stats.i64"
+            if stats_path.exists():
+                stored_dim = int(np.fromfile(stats_path, dtype=np.int64, count=3)[2])
+                if stored_dim != self.dim:
+                    self._logger.warning(
+                        "similar index dim changed (%d -> %d), rebuilding", stored_dim, self.dim
+                    )
+                    self._create_files()
+            else:
+                self._create_files()
+            self._map_stats()
+            self._map_rows()
+
+    def ensure(self, engine: Engine) -> None:
+        """索引ファイルを開き、未登録の既存投稿をバックフィルする"""
+        self.open()
+        if not inspect(engine).has_table("posts"):
+            return
+        with self._locked(), Session(engine) as db:
+            self._refresh()
+            count = int(self._stats[0])
+            last_id = int(self._rows[0][:count].max()) if count else 0
+            total = 0
+            while True:
+                batch = (
+                    db.query(Post)
+                    .filter(Post.id > last_id)
+                    .order_by(Post.id.asc())
+                    .limit(1000)
+                    .all()
+                )
+                if not batch:
+                    break
+                for post in batch:
+                    self._append(post.id, post.body)
+                last_id = batch[-1].id
+                total += len(batch)
+            self._rows[1].flush()
+            if total:
+                self._logger.info("similar index backfilled: %d posts", total)
+
+    # --- ベクトル化 ---------------------------------------------------
+
+    def _features(self, body: str) -> Dict[int, float]:
+        """文字n-gramをハッシュした (次元 -> 符号付きTF) 。符号で衝突の偏りを打ち消す"""
+        tf: Dict[int, float] = {}
+        texts = (("b", "".join(body.split())), ("r", "".join(reading(body).split())))
+        for prefix, s in texts:
+            for n in self.ngram_sizes:
+                for i in range(len(s) - n + 1):
+                    h = zlib.crc32(f"{prefix}:{s[i:i + n]}".encode())
+                    idx = h % self.dim
+                    sign = 1.0 if (h // self.dim) & 1 else -1.0
+                    tf[idx] = tf.get(idx, 0.0) + sign
+        return tf
+
+    def _vectorize(self, tf: Dict[int, float], n_docs: int) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        if not tf:
+            return vec
+        idx = np.fromiter(tf.keys(), dtype=np.int64, count=len(tf))
+        raw = np.fromiter(tf.values(), dtype=np.float32, count=len(tf))
+        # サブリニアTF × 平滑化IDF
+        weights = np.sign(raw) * (1.0 + np.log(np.maximum(np.abs(raw), 1.0)))
+        df = self._stats[self.header_size:][idx]
+        idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+        vec[idx] = weights * idf
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+    # --- 追記・検索 ---------------------------------------------------
+
+    def _append(self, post_id: int, body: str) -> None:
+        """ロック保持中に1件追記（件数は最後に更新し、読み手に書きかけの行を見せない）"""
+        count = int(self._stats[0])
+        if count >= int(self._stats[1]):
+            self._grow()
+        tf = self._features(body)
+        if tf:
+            idx = np.fromiter(tf.keys(), dtype=np.int64, count=len(tf))
+            self._stats[self.header_size + idx] += 1
+        ids, vectors = self._rows
+        vectors[count] = self._vectorize(tf, count + 1)
+        ids[count] = post_id
+        self._stats[0] = count + 1
+
+    def add(self, post_id: int, body: str) -> None:
+        """投稿作成後に呼ぶ（post_created ジョブから）。登録済みの投稿は無視する"""
+        with self._locked():
+            self._refresh()
+            count = int(self._stats[0])
+            if count and (self._rows[0][:count] == post_id).any():
+                return
+            self._append(post_id, body)
+
+    def query(self, body: str, limit: int = 10, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """本文に近い投稿を (post_id, cosine) の降順で返す"""
+        self._refresh()
+        # 組を先に取ってから件数を読む（拡張前の組なら件数は容量で切り詰められる）
+        ids, vectors = self._rows
+        count = min(int(self._stats[0]), ids.shape[0])
+        if count == 0:
+            return []
+        vec = self._vectorize(self._features(body), count)
+        scores = vectors[:count] @ vec
+        if exclude_id is not None:
+            scores[ids[:count] == exclude_id] = -np.inf
+        k = min(limit, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0 and math.isfinite(scores[i])]
+
+    def similar_to(self, post_id: int, body: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """投稿に似た投稿（自身を除く）。結果はTTLの間キャッシュする"""
+        key = (post_id, limit)
+        now = time.time()
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > now:
+                self._cache.move_to_end(key)
+                return cached[1]
+        results = self.query(body, limit=limit, exclude_id=post_id)
+        with self._cache_lock:
+            self._cache[key] = (now + self.cache_ttl_seconds, results)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return results
+
+
+similar_index = SimilarIndex()
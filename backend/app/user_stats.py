@@ -0,0 +1,49 @@
+from typing import Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .models import UserStats
+
+
+def bump(db: Session, user_id: Optional[int], posts: int = 0, reactions: int = 0) -> None:
+    """集計を増減する。投稿/リアクションと同じトランザクションで呼ぶことで、
+    起動時のバックフィルと二重に数えない。匿名（user_id=None）は対象外"""
+    if user_id is None or (posts == 0 and reactions == 0):
+        return
+    db.execute(
+        text(
+            "INSERT INTO user_stats (user_id, post_count, reactions_received)"
+            " VALUES (:user_id, :posts, :reactions)"
+            " ON CONFLICT (user_id) DO UPDATE SET"
+            " post_count = user_stats.post_count + excluded.post_count,"
+            " reactions_received = user_stats.reactions_received + excluded.reactions_received"
+        ),
+        {"user_id": user_id, "posts": posts, "reactions": reactions},
+    )
+
+
+def get(db: Session, user_id: int) -> dict:
+    row = db.get(UserStats, user_id)
+    return {
+        "post_count": row.post_count if row else 0,
+        "reactions_received": max(row.reactions_received, 0) if row else 0,
+    }
+
+
+def backfill(engine: Engine) -> None:
+    """集計行の無いユーザーを posts から一度だけ集計して作成する（導入前の投稿分）"""
+    if not inspect(engine).has_table("user_stats"):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO user_stats (user_id, post_count, reactions_received)"
+            " SELECT user_id, COUNT(*), COALESCE(SUM(sense_count + fukai_count), 0)"
+            " FROM posts"
+            " WHERE user_id IS NOT NULL"
+            " AND user_id NOT IN (SELECT user_id FROM user_stats)"
+            " GROUP BY user_id"
+            # 複数ワーカーが同時に起動しても主キー衝突で落ちないようにする
+            " ON CONFLICT (user_id) DO NOTHING"
+        ))
@@ -0,0 +1,53 @@
+import threading
+
+from fugashi import Tagger
+
+# 形態素解析器（起動時に一度初期化）
+tagger = Tagger()
+
+# MeCabのTaggerはスレッドセーフではないため、ジョブワーカー等の別スレッドでは個別に持つ
+_local = threading.local()
+
+
+def _thread_tagger() -> Tagger:
+    if threading.current_thread() is threading.main_thread():
+        return tagger
+    if not hasattr(_local, "tagger"):
+        _local.tagger = Tagger()
+    return _local.tagger
+
+
+def token_reading(tok) -> str:
+    # fugashi(unidic-lite)の特徴量から読みを取得
+    yomi = None
+    feat = getattr(tok, "feature", None)
+    if feat is not None:
+        try:
+            # pron / kana / pronBase / kanaBase を優先的に参照
+            yomi = (
+                feat.get("pron")
+                or feat.get("kana")
+                or feat.get("pronBase")
+                or feat.get("kanaBase")
+            )
+        except Exception:
+            try:
+                yomi = getattr(feat, "pron", None) or getattr(feat, "kana", None)
+            except Exception:
+                yomi = None
+    return yomi if yomi and yomi != "*" else tok.surface
+
+
+def to_hiragana(s: str) -> str:
+    """カタカナをひらがなに寄せる（ヴ等の対応外文字はそのまま）"""
+    return "".join(
+        chr(ord(ch) - 0x60) if "ァ" <= ch <= "ヶ" else ch
+        for ch in s
+    )
+
+
+def reading(s: str) -> str:
+    """テキスト全体の読みをひらがなで返す（検索・類似度計算用）"""
+    if not s:
+        return ""
+    return to_hiragana("".join(token_reading(t) for t in _thread_tagger()(s)))
@@ -27,12 +27,13 @@ const PostDetailPage: React.FC<PostDetailPageProps> = ({ addPost }) => {
 
   const storageKey = 'reactedByPost';
 
-  const mapCountsToReactions = (sense?: number, fukai?: number, postId?: string) => {
+  const mapCountsToReactions = (sense?: number, fukai?: number, postId?: string, viewerReactions?: string[] | null) => {
     const reactions = getInitialReactions();
     const store = JSON.parse(localStorage.getItem(storageKey) || '{}');
     
     return reactions.map(r => {
-      const isReacted = postId ? !!store[`${postId}:${r.id}`] : false;
+      // サーバーが返す閲覧者のリアクションを優先し、未ログイン（null）のときだけ以前のローカル記録を使う
+      const isReacted = viewerReactions ? viewerReactions.includes(r.id) : (postId ? !!store[`${postId}:${r.id}`] : false);
       if (r.id === (ReactionId as any).Sense) return { ...r, count: sense ?? 0, isReacted };
       if (r.id === (ReactionId as any).Fukai) return { ...r, count: fukai ?? 0, isReacted };
       return { ...r, isReacted };
@@ -53,7 +54,7 @@ const PostDetailPage: React.FC<PostDetailPageProps> = ({ addPost }) => {
         line2: p.line2,
         line3: p.line3,
         image: p.image,
-        reactions: mapCountsToReactions(p.sense_count, p.fukai_count, String(p.id)),
+        reactions: mapCountsToReactions(p.sense_count, p.fukai_count, String(p.id), p.viewer_reactions),
         timestamp: p.created_at ? new Date(p.created_at).getTime() : Date.now(),
         visibility: 'public' as any,
         isAiGenerated: false,
@@ -119,7 +120,7 @@ const PostDetailPage: React.FC<PostDetailPageProps> = ({ addPost }) => {
         line2: mainPost.line2,
         line3: mainPost.line3,
         image: mainPost.image,
-        reactions: mapCountsToReactions(mainPost.sense_count, mainPost.fukai_count, String(mainPost.id)),
+        reactions: mapCountsToReactions(mainPost.sense_count, mainPost.fukai_count, String(mainPost.id), mainPost.viewer_reactions),
         timestamp: mainPost.created_at ? new Date(mainPost.created_at).getTime() : Date.now(),
         visibility: 'public' as any,
         isAiGenerated: false,
@@ -135,7 +136,7 @@ const PostDetailPage: React.FC<PostDetailPageProps> = ({ addPost }) => {
         line2: quoted.line2,
         line3: quoted.line3,
         image: quoted.image,
-        reactions: mapCountsToReactions(quoted.sense_count, quoted.fukai_count, String(quoted.id)),
+        reactions: mapCountsToReactions(quoted.sense_count, quoted.fukai_count, String(quoted.id), quoted.viewer_reactions),
         timestamp: quoted.created_at ? new Date(quoted.created_at).getTime() : Date.now(),
         visibility: 'public' as any,
         isAiGenerated: false,
@@ -176,17 +177,27 @@ const PostDetailPage: React.FC<PostDetailPageProps> = ({ addPost }) => {
     });
   };
 
+  // 表示中の投稿（メイン・引用元・返信ツリー）からIDで探す
+  const findPost = (postId: string): HaikuPost | undefined => {
+    const walk = (posts: HaikuPost[]): HaikuPost | undefined => {
+      for (const p of posts) {
+        if (p.id === postId) return p;
+        const found = (p as any).replies ? walk((p as any).replies) : undefined;
+        if (found) return found;
+      }
+      return undefined;
+    };
+    return walk([post, quotedPost, ...replies].filter(Boolean) as HaikuPost[]);
+  };
+
   const handleReaction = async (postId: string, reactionId: ReactionId) => {
     try {
-      const store = JSON.parse(localStorage.getItem(storageKey) || '{}');
-      const key = `${postId}:${reactionId}`;
-      const isReacted = !!store[key];
+      // 付ける/外すは表示中の状態（サーバーの viewer_reactions 由来）で決める
+      const isReacted = !!findPost(postId)?.reactions.find(r => r.id === reactionId)?.isReacted;
       const kind = reactionId === (ReactionId as any).Sense ? 'sense' : 'fukai';
       const updated = isReacted ? await unreact(parseInt(postId, 10), kind as any) : await react(parseInt(postId, 10), kind as any);
-      store[key] = !isReacted;
-      localStorage.setItem(storageKey, JSON.stringify(store));
       
-      const updatedReactions = mapCountsToReactions(updated.sense_count, updated.fukai_count, postId);
+      const updatedReactions = mapCountsToReactions(updated.sense_count, updated.fukai_count, postId, updated.viewer_reactions);
       
       // メイン投稿のリアクション状態を更新
       setPost(prev => prev ? {
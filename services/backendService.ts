@@ -12,6 +12,7 @@ export interface BackendPost {
   fukai_count?: number;
   created_at?: string;
   user?: BackendUser;
+  viewer_reactions?: string[] | null;  // 閲覧者が付けたリアクション（未ログイン・未取得時はnull）
 }
 
 export interface BackendUser {
@@ -45,17 +46,38 @@ function removeAuthToken(): void {
   localStorage.removeItem(TOKEN_KEY);
 }
 
+// 書き込み直後の読み取りをサーバーがプライマリDBへ寄せるためのマーカー（書き込みレスポンスで受け取り、そのまま送り返す）
+const LAST_WRITE_KEY = 'haiku-last-write';
+const LAST_WRITE_HEADER = 'X-Last-Write';
+
 function getAuthHeaders(): HeadersInit {
   const token = getAuthToken();
+  const lastWrite = localStorage.getItem(LAST_WRITE_KEY);
   return {
     'Content-Type': 'application/json',
     ...(token && { 'Authorization': `Bearer ${token}` }),
+    ...(lastWrite && { [LAST_WRITE_HEADER]: lastWrite }),
+  };
+}
+
+async function apiFetch(input: string, init?: RequestInit): Promise<Response> {
+  const res = await fetch(input, init);
+  const lastWrite = res.headers.get(LAST_WRITE_HEADER);
+  if (lastWrite) localStorage.setItem(LAST_WRITE_KEY, lastWrite);
+  return res;
+}
+
+// 投稿作成の再送で重複しないよう、同じ操作のリトライには同じキーを渡す
+function getPostHeaders(idempotencyKey?: string): HeadersInit {
+  return {
+    ...getAuthHeaders(),
+    ...(idempotencyKey && { 'Idempotency-Key': idempotencyKey }),
   };
 }
 
 // 認証API
 export async function signup(email: string, password: string, displayName: string): Promise<AuthToken> {
-  const res = await fetch(`${API_BASE}/api/auth/signup`, {
+  const res = await apiFetch(`${API_BASE}/api/auth/signup`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
     body: JSON.stringify({ email, password, display_name: displayName }),
@@ -70,7 +92,7 @@ export async function signup(email: string, password: string, displayName: strin
 }
 
 export async function login(email: string, password: string): Promise<AuthToken> {
-  const res = await fetch(`${API_BASE}/api/auth/login`, {
+  const res = await apiFetch(`${API_BASE}/api/auth/login`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
     body: JSON.stringify({ email, password }),
@@ -85,7 +107,7 @@ export async function login(email: string, password: string): Promise<AuthToken>
 }
 
 export async function getCurrentUser(): Promise<BackendUser> {
-  const res = await fetch(`${API_BASE}/api/auth/me`, {
+  const res = await apiFetch(`${API_BASE}/api/auth/me`, {
     headers: getAuthHeaders(),
   });
   if (!res.ok) throw new Error(`Failed to get current user: ${res.status}`);
@@ -105,17 +127,39 @@ export async function fetchPosts(sort?: 'new'|'trending', page?: number): Promis
   const queryString = params.toString();
   const url = `${API_BASE}/api/posts${queryString ? `?${queryString}` : ''}`;
   
-  const res = await fetch(url, {
+  const res = await apiFetch(url, {
     headers: getAuthHeaders(),
   });
   if (!res.ok) throw new Error(`Failed to fetch posts: ${res.status}`);
   return res.json();
 }
 
-export async function createPost(payload: Omit<BackendPost, 'id' | 'created_at' | 'user'>): Promise<BackendPost> {
-  const res = await fetch(`${API_BASE}/api/posts`, {
-    method: 'POST',
+// ユーザー別タイムライン
+export interface UserPostsPage {
+  user: BackendUser;
+  stats: { post_count: number; reactions_received: number };
+  items: BackendPost[];
+  next_before_id?: number;
+}
+
+export async function fetchUserPosts(
+  userId: number,
+  type: 'all'|'posts'|'replies'|'quotes' = 'all',
+  beforeId?: number,
+): Promise<UserPostsPage> {
+  const params = new URLSearchParams({ type });
+  if (beforeId) params.append('before_id', beforeId.toString());
+  const res = await apiFetch(`${API_BASE}/api/users/${userId}/posts?${params.toString()}`, {
     headers: getAuthHeaders(),
+  });
+  if (!res.ok) throw new Error(`Failed to fetch user posts: ${res.status}`);
+  return res.json();
+}
+
+export async function createPost(payload: Omit<BackendPost, 'id' | 'created_at' | 'user'>, idempotencyKey?: string): Promise<BackendPost> {
+  const res = await apiFetch(`${API_BASE}/api/posts`, {
+    method: 'POST',
+    headers: getPostHeaders(idempotencyKey),
     body: JSON.stringify(payload),
   });
   if (!res.ok) {
@@ -128,11 +172,12 @@ export async function createPost(payload: Omit<BackendPost, 'id' | 'created_at'
 // 返信・引用API
 export async function replyToPost(
   postId: number, 
-  payload: Omit<BackendPost, 'id' | 'created_at' | 'user' | 'reply_to_id' | 'quoted_post_id'>
+  payload: Omit<BackendPost, 'id' | 'created_at' | 'user' | 'reply_to_id' | 'quoted_post_id'>,
+  idempotencyKey?: string
 ): Promise<BackendPost> {
-  const res = await fetch(`${API_BASE}/api/posts/${postId}/reply`, {
+  const res = await apiFetch(`${API_BASE}/api/posts/${postId}/reply`, {
     method: 'POST',
-    headers: getAuthHeaders(),
+    headers: getPostHeaders(idempotencyKey),
     body: JSON.stringify(payload),
   });
   if (!res.ok) {
@@ -144,11 +189,12 @@ export async function replyToPost(
 
 export async function quotePost(
   postId: number, 
-  payload: Omit<BackendPost, 'id' | 'created_at' | 'user' | 'reply_to_id' | 'quoted_post_id'>
+  payload: Omit<BackendPost, 'id' | 'created_at' | 'user' | 'reply_to_id' | 'quoted_post_id'>,
+  idempotencyKey?: string
 ): Promise<BackendPost> {
-  const res = await fetch(`${API_BASE}/api/posts/${postId}/quote`, {
+  const res = await apiFetch(`${API_BASE}/api/posts/${postId}/quote`, {
     method: 'POST',
-    headers: getAuthHeaders(),
+    headers: getPostHeaders(idempotencyKey),
     body: JSON.stringify(payload),
   });
   if (!res.ok) {
@@ -159,7 +205,7 @@ export async function quotePost(
 }
 
 export async function getPostReplies(postId: number): Promise<BackendPost[]> {
-  const res = await fetch(`${API_BASE}/api/posts/${postId}/replies`, {
+  const res = await apiFetch(`${API_BASE}/api/posts/${postId}/replies`, {
     headers: getAuthHeaders(),
   });
   if (!res.ok) throw new Error(`Failed to fetch replies: ${res.status}`);
@@ -167,7 +213,7 @@ export async function getPostReplies(postId: number): Promise<BackendPost[]> {
 }
 
 export async function getPostQuotes(postId: number): Promise<BackendPost[]> {
-  const res = await fetch(`${API_BASE}/api/posts/${postId}/quotes`, {
+  const res = await apiFetch(`${API_BASE}/api/posts/${postId}/quotes`, {
     headers: getAuthHeaders(),
   });
   if (!res.ok) throw new Error(`Failed to fetch quotes: ${res.status}`);
@@ -175,7 +221,7 @@ export async function getPostQuotes(postId: number): Promise<BackendPost[]> {
 }
 
 export async function react(postId: number, kind: 'sense'|'fukai'): Promise<BackendPost> {
-  const res = await fetch(`${API_BASE}/api/posts/${postId}/react/${kind}`, { 
+  const res = await apiFetch(`${API_BASE}/api/posts/${postId}/react/${kind}`, { 
     method: 'POST',
     headers: getAuthHeaders(),
   });
@@ -184,7 +230,7 @@ export async function react(postId: number, kind: 'sense'|'fukai'): Promise<Back
 }
 
 export async function unreact(postId: number, kind: 'sense'|'fukai'): Promise<BackendPost> {
-  const res = await fetch(`${API_BASE}/api/posts/${postId}/react/${kind}`, { 
+  const res = await apiFetch(`${API_BASE}/api/posts/${postId}/react/${kind}`, { 
     method: 'DELETE',
     headers: getAuthHeaders(),
   });
@@ -192,6 +238,63 @@ export async function unreact(postId: number, kind: 'sense'|'fukai'): Promise<Ba
   return res.json();
 }
 
+// リアルタイム更新（SSE）
+export interface ReactionCountsEvent {
+  post_id: number;
+  sense: number;        // 集約窓内の差分
+  fukai: number;
+  sense_count: number;  // 最新の絶対値
+  fukai_count: number;
+}
+
+export interface FeedEventHandlers {
+  onPost?: (post: BackendPost) => void;
+  onReply?: (post: BackendPost) => void;
+  onReactions?: (counts: ReactionCountsEvent[]) => void;
+  // 再接続後に呼ばれる。切断中（サーバー側で低速購読者として切られた場合を含む）のイベントは届かないので再取得する
+  onReconnect?: () => void;
+}
+
+const EVENTS_RECONNECT_MS = 3000;
+
+// 購読を開始し、解除関数を返す（切断時はEventSourceが自動再接続し、閉じられた場合は作り直す）
+export function subscribeEvents(handlers: FeedEventHandlers): () => void {
+  let source: EventSource | null = null;
+  let connectedOnce = false;
+  let closed = false;
+  let timer: ReturnType<typeof setTimeout> | undefined;
+
+  const connect = () => {
+    const es = new EventSource(`${API_BASE}/api/events`);
+    source = es;
+    const listen = <T,>(type: string, handler?: (data: T) => void) => {
+      if (!handler) return;
+      es.addEventListener(type, (e) => handler(JSON.parse((e as MessageEvent).data)));
+    };
+    listen<BackendPost>('post', handlers.onPost);
+    listen<BackendPost>('reply', handlers.onReply);
+    listen<ReactionCountsEvent[]>('reactions', handlers.onReactions);
+    es.addEventListener('open', () => {
+      if (connectedOnce) handlers.onReconnect?.();
+      connectedOnce = true;
+    });
+    es.addEventListener('error', () => {
+      // CLOSED はブラウザが再接続を諦めた状態なので、自前で作り直す
+      if (es.readyState === EventSource.CLOSED && !closed) {
+        es.close();
+        timer = setTimeout(connect, EVENTS_RECONNECT_MS);
+      }
+    });
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(timer);
+    source?.close();
+  };
+}
+
 // AIプロキシAPI
 export interface HaikuGenerationRequest {
   text: string;
@@ -204,7 +307,7 @@ export interface HaikuGenerationResponse {
 }
 
 export async function generateHaiku(request: HaikuGenerationRequest): Promise<HaikuGenerationResponse> {
-  const res = await fetch(`${API_BASE}/api/ai/haiku`, {
+  const res = await apiFetch(`${API_BASE}/api/ai/haiku`, {
     method: 'POST',
     headers: getAuthHeaders(),
     body: JSON.stringify(request),
@@ -230,7 +333,7 @@ export interface MoraCountResponse {
 }
 
 export async function countMora(payload: MoraCountPayload): Promise<MoraCountResponse> {
-  const res = await fetch(`${API_BASE}/api/mora/count`, {
+  const res = await apiFetch(`${API_BASE}/api/mora/count`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
     body: JSON.stringify(payload),